@@ -1,5 +1,3 @@
-import sys
-import machine
 from machine import Pin
 from rp2 import PIO, StateMachine, asm_pio
 from micropython import const
@@ -7,30 +5,11 @@ from array import array
 from uctypes import addressof
 from gc import mem_free, collect
 from math import sin, cos, pi
-from time import ticks_ms, ticks_diff, sleep_ms
-import select
 
  # GP0-2 used for RGB, GP4-5 for sync signals also used by PIO 
+ # Importing this module has no side effects: call init() to start the display, deinit() to release it
 
-# external control (GP16-GP21)
-AVAILABLE_GPIOS = {16, 17, 18, 19, 20, 21} 
-gpio_pins = {} 
-OVCLK = False
-
-def init_gpio(pin_num):
-    if pin_num in AVAILABLE_GPIOS and pin_num not in gpio_pins:
-        gpio_pins[pin_num] = Pin(pin_num, Pin.OUT)
-        gpio_pins[pin_num].off()
-        return True
-    return False
-
-def gpio_control(pin_num, state):
-    if pin_num not in AVAILABLE_GPIOS:
-        return False, f"GP{pin_num} not available"
-    if pin_num not in gpio_pins:
-        init_gpio(pin_num)
-    gpio_pins[pin_num].value(state)
-    return True, f"GP{pin_num} {'ON' if state else 'OFF'}"
+OVCLK = False  # Default for init(): True selects MODE_OVERCLOCK
 
 @micropython.viper
 def set_freq(fclock: int) -> int:
@@ -50,12 +29,6 @@ def set_freq(fclock: int) -> int:
     
     return (int(fb) * 12) // (int(post1) * int(post2)) 
 
-mhz = set_freq(125_000_000) 
-if mhz > 0:
-    print(f"CPU Speed: {mhz} MHz")
-else:
-    print("ERROR: Frequency setting failed!")
-
 H_res = const(640)
 V_res = const(480)
 
@@ -66,6 +39,15 @@ PIXEL_BITMASK = const(0b111)  # 3-bit mask for extracting pixel data
 # Memory organization for Raspberry Pi Pico (32-bit architecture)
 USABLE_BITS = const(30)  # Use 30 bits per word (2 bits unused for alignment)
 PIXELS_PER_WORD = const(10)  # 30 bits / 3 bits = 10 pixels per word
+ROW_WORDS = const(64)  # 640 pixels / 10 pixels per word = 64 words per scanline
+
+# Raster ops, OR'ed into the color argument of the drawing functions (e.g. RED | ROP_XOR)
+# COPY overwrites, XOR toggles (drawing twice restores), OR sets bits, AND keeps only common bits
+ROP_COPY = const(0b00000)
+ROP_XOR  = const(0b01000)
+ROP_OR   = const(0b10000)
+ROP_AND  = const(0b11000)
+ROP_MASK = const(0b11000)
 
 # Backward compatibility aliases
 bit_per_pix = BITS_PER_PIXEL
@@ -73,17 +55,9 @@ pixel_bitmask = PIXEL_BITMASK
 usable_bits = USABLE_BITS
 pix_per_words = PIXELS_PER_WORD
 
-if OVCLK:
-    # !!!!!! Overclocked mode (experimental - may be unstable!!!!!!! )
-    set_freq(250000000)  # Boost CPU to 250 MHz
-    SM0_FREQ = 125875000  # SM0: Horizontal sync frequency
-    SM1_FREQ = 125000000  # SM1: Vertical sync frequency
-    SM2_FREQ = 113287500  # SM2: RGB data frequency
-else:
-    # Normal mode (recommended - stable use this one if you love ur pico)
-    SM0_FREQ = 25175000   # 25.175 MHz - VGA pixel clock for 640x480@60Hz
-    SM1_FREQ = 125000000  # 125 MHz - Sync timing clock
-    SM2_FREQ = 100700000  # 100.7 MHz - RGB data output clock
+# Modes for init()
+MODE_NORMAL = const(0)     # Normal mode (recommended - stable use this one if you love ur pico)
+MODE_OVERCLOCK = const(1)  # !!!!!! Overclocked mode (experimental - may be unstable!!!!!!! )
 
 
 @asm_pio(set_init=PIO.OUT_HIGH, autopull=True, pull_thresh=32)
@@ -100,7 +74,6 @@ def paral_Hsync():
     irq(0)
     wrap()
 
-paral_write_Hsync = StateMachine(0, paral_Hsync, freq=SM0_FREQ, set_base=Pin(4))
 
 @asm_pio(sideset_init=(PIO.OUT_HIGH,) * 1, autopull=True, pull_thresh=32)
 def paral_Vsync():
@@ -124,7 +97,6 @@ def paral_Vsync():
     wait(1, irq, 0)
     wrap()
 
-paral_write_Vsync = StateMachine(1, paral_Vsync, freq=SM1_FREQ, sideset_base=Pin(5))
 
 @asm_pio(out_init=(PIO.OUT_LOW,) * 3, out_shiftdir=PIO.SHIFT_RIGHT, 
          sideset_init=(PIO.OUT_LOW,) * 3, autopull=True, pull_thresh=usable_bits)
@@ -140,7 +112,6 @@ def paral_RGB():
     jmp(x_dec, "colorout")
     wrap()
 
-paral_write_RGB = StateMachine(2, paral_RGB, freq=SM2_FREQ, out_base=Pin(0), sideset_base=Pin(0))
 
 
 # DMA Channel 0 Registers
@@ -207,114 +178,518 @@ def stopsync():
     ptr32(PIO_ENABLE_REGISTER)[0] &= 0b111111111000  # clear bits 0,1,2
 
 
+# Surfaces
+# A Surface is a packed pixel buffer in the frame buffer format (10 pixels per 30-bit
+# word, `stride` words per row). The drawing functions write to the current target,
+# which is the screen unless another surface is selected with target() or `with`:
+#     panel = Surface(200, 30)
+#     with panel:
+#         draw_text(0, 0, "Terminal", GREEN)
+#     blit(panel, screen, 435, 5)
+# The screen's rows start one word early (offset -1) to line up with the DMA, so its
+# first word lives at the end of the buffer.
+class Surface:
+    def __init__(self, width, height, data=None, stride=0, offset=0):
+        self.width = width
+        self.height = height
+        self.stride = stride or (width + PIXELS_PER_WORD - 1) // PIXELS_PER_WORD
+        self.offset = offset
+        if data is None:
+            data = array('L', bytearray(4 * self.stride * height))
+        self.data = data
+        self.clip = array('l', [0, 0, width, height])  # x1, y1, x2, y2 (x2, y2 exclusive)
+        self._prev = None
+
+    def __enter__(self):
+        self._prev = target(self)
+        return self
+
+    def __exit__(self, *exc):
+        target(self._prev)
+
+
+screen = None  # The frame buffer as a Surface, set up by init()
+_target = None  # Surface the drawing functions write to
+_tdata = None  # Its word array
+# Its width, height, stride, offset, word count and clip rect (x1, y1, x2, y2)
+_tgeom = array('l', [H_res, V_res, ROW_WORDS, -1, 0, 0, 0, H_res, V_res])
+
+def target(surface=None):
+    # Select the surface the drawing functions write to (None: the screen).
+    # Returns the previously selected one.
+    global _target, _tdata
+    prev = _target
+    s = surface or screen
+    _target = s
+    _tdata = s.data
+    _tgeom[0] = s.width
+    _tgeom[1] = s.height
+    _tgeom[2] = s.stride
+    _tgeom[3] = s.offset
+    _tgeom[4] = len(s.data)
+    for i in range(4):
+        _tgeom[5 + i] = s.clip[i]
+    return prev
+
+# Clip rects
+# Every primitive checks the clip rect of its target once: shapes entirely outside are
+# rejected before any work, shapes entirely inside skip the per-word checks. push_clip()
+# narrows the current rect (intersecting it with the new one), pop_clip() restores the
+# previous one. Push and pop in pairs on the same target.
+CLIP_DEPTH = const(8)
+_clip_stack = array('l', range(4 * CLIP_DEPTH))
+_clip_depth = 0
+
+def _set_clip(x1, y1, x2, y2):
+    c = _target.clip
+    c[0] = _tgeom[5] = x1
+    c[1] = _tgeom[6] = y1
+    c[2] = _tgeom[7] = x2 if x2 > x1 else x1
+    c[3] = _tgeom[8] = y2 if y2 > y1 else y1
+
+def push_clip(x1, y1, x2, y2):
+    # Clip drawing to x1 <= x < x2, y1 <= y < y2 (and the rect already in place)
+    global _clip_depth
+    if _clip_depth == CLIP_DEPTH:
+        raise RuntimeError("Clip stack full")
+    g = _tgeom
+    k = 4 * _clip_depth
+    for i in range(4):
+        _clip_stack[k + i] = g[5 + i]
+    _clip_depth += 1
+    if x2 < x1:
+        x1, x2 = x2, x1
+    if y2 < y1:
+        y1, y2 = y2, y1
+    _set_clip(max(x1, g[5]), max(y1, g[6]), min(x2, g[7]), min(y2, g[8]))
+
+def pop_clip():
+    global _clip_depth
+    if _clip_depth == 0:
+        raise RuntimeError("Clip stack empty")
+    _clip_depth -= 1
+    k = 4 * _clip_depth
+    _set_clip(_clip_stack[k], _clip_stack[k + 1], _clip_stack[k + 2], _clip_stack[k + 3])
+
+def _outside(x1, y1, x2, y2):
+    # True when the box x1 <= x < x2, y1 <= y < y2 misses the clip rect (trivial reject)
+    g = _tgeom
+    return x2 <= g[5] or x1 >= g[7] or y2 <= g[6] or y1 >= g[8]
+
+# Pattern fills
+# A fill color can carry a pattern number and a background color next to its
+# foreground and raster op:  fg | ROP | pattern << PATTERN_SHIFT | bg << BG_SHIFT
+# Each pattern is kept pre-expanded as pixel masks in the frame buffer format, 8 rows
+# of 2 words (20 pixels, the smallest period that is both a whole number of words and
+# of 4 pixel wide Bayer cells). A filled span therefore merges fg and bg once per
+# row and still writes whole words. Patterns 1-15 are the levels of a 4x4 Bayer
+# dither (dither()), 16-31 are free for add_pattern(). Spans (fill_rect,
+# fill_triangle, fill_disk, ellipses, rounded rects) use the pattern; pixels, lines
+# and text draw in fg. Patterns are anchored to the target, so neighbouring fills mesh.
+PATTERN_SHIFT = const(5)
+BG_SHIFT = const(10)
+PATTERN_ROWS = const(8)
+PATTERN_WORDS = const(16)  # 8 rows x 2 words per pattern
+BAYER_4X4 = b'\x00\x08\x02\x0a\x0c\x04\x0e\x06\x03\x0b\x01\x09\x0f\x07\x0d\x05'
+_pattern_masks = None  # 32 patterns, built on first use
+_user_patterns = 16  # Next free pattern number
+
+def _set_pattern(number, bit):
+    # bit(x, y) -> True where the pattern shows the foreground, for x < 20, y < 8
+    m = _pattern_masks
+    k = number * PATTERN_WORDS
+    for y in range(PATTERN_ROWS):
+        for w in range(2):
+            mask = 0
+            for i in range(PIXELS_PER_WORD):
+                if bit(w * PIXELS_PER_WORD + i, y):
+                    mask |= PIXEL_BITMASK << (BITS_PER_PIXEL * i)
+            m[k] = mask
+            k += 1
+
+def _patterns():
+    global _pattern_masks
+    if _pattern_masks is None:
+        _pattern_masks = array('L', bytearray(4 * 32 * PATTERN_WORDS))
+        for level in range(1, 16):
+            _set_pattern(level, lambda x, y: BAYER_4X4[(y & 3) * 4 + (x & 3)] < level)
+    return _pattern_masks
+
+def dither(fg, bg, level):
+    # Fill color showing fg on level/16 of the pixels and bg on the rest
+    if level <= 0:
+        return bg
+    if level >= 16:
+        return fg
+    _patterns()
+    return fg | (level << PATTERN_SHIFT) | (bg << BG_SHIFT)
+
+def add_pattern(rows):
+    # rows: 1, 2, 4 or 8 rows of 0/1 (1 = foreground), all 1, 2, 4, 5, 10 or 20 pixels
+    # wide. Returns a pattern number for pattern().
+    global _user_patterns
+    h = len(rows)
+    w = len(rows[0])
+    if PATTERN_ROWS % h or 20 % w or any(len(r) != w for r in rows):
+        raise ValueError("Pattern must be 1/2/4/8 rows of 1/2/4/5/10/20 pixels")
+    if _user_patterns == 32:
+        raise RuntimeError("No free pattern")
+    _patterns()
+    number = _user_patterns
+    _set_pattern(number, lambda x, y: rows[y % h][x % w])
+    _user_patterns += 1
+    return number
+
+def pattern(number, fg, bg):
+    _patterns()
+    return fg | (number << PATTERN_SHIFT) | (bg << BG_SHIFT)
+
+_blit_args = array('l', [0, 0, 0, 0, 0, 0])
+
+def blit(src, dst, x, y):
+    # Copy all of src onto dst (None: the screen) with its top-left corner at (x, y),
+    # clipped to dst's clip rect. Whole words are copied when x lines up with a word
+    # boundary, otherwise every destination word is shifted together from two source words.
+    dst = dst or screen
+    c = dst.clip
+    x1 = max(x, c[0])
+    y1 = max(y, c[1])
+    x2 = min(x + src.width, c[2])
+    y2 = min(y + src.height, c[3])
+    if x2 <= x1 or y2 <= y1:
+        return
+    a = _blit_args
+    a[0] = x1 - x
+    a[1] = y1 - y
+    a[2] = x1
+    a[3] = y1
+    a[4] = x2 - x1
+    a[5] = y2 - y1
+    _blit(src, dst, a)
+
+@micropython.viper
+def _blit(src, dst, args):
+    a = ptr32(args)
+    sx = a[0]
+    sy = a[1]
+    dx = a[2]
+    dy = a[3]
+    cw = a[4]
+    ch = a[5]
+    S = ptr32(src.data)
+    ss = int(src.stride)
+    so = int(src.offset)
+    sn = int(len(src.data))
+    D = ptr32(dst.data)
+    ds = int(dst.stride)
+    do = int(dst.offset)
+    dn = int(len(dst.data))
+    full = 0x3FFFFFFF
+    c1 = dx // int(PIXELS_PER_WORD)  # First and last destination word columns
+    c2 = (dx + cw - 1) // int(PIXELS_PER_WORD)
+    p = (dx - c1 * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL)
+    m1 = (full >> p) << p  # Pixels of the first word inside the copy
+    e = (dx + cw - 1 - c2 * int(PIXELS_PER_WORD) + 1) * int(BITS_PER_PIXEL)
+    m2 = full >> (int(USABLE_BITS) - e)  # Pixels of the last word inside the copy
+    if c1 == c2:
+        m1 &= m2
+    # Source pixel landing on pixel 0 of word column c1 is sx - dx % 10, i.e. bit
+    # `sh` of source word column a0
+    q = sx - p // int(BITS_PER_PIXEL) + int(PIXELS_PER_WORD)
+    a0 = q // int(PIXELS_PER_WORD) - 1
+    sh = (q - (a0 + 1) * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL)
+    back = int(USABLE_BITS) - sh
+    n = c2 - c1
+    for row in range(ch):
+        sk = (sy + row) * ss + so + a0
+        dk = (dy + row) * ds + do + c1
+        if sh == 0:
+            k = sk if sk >= 0 else sk + sn
+            d = dk if dk >= 0 else dk + dn
+            D[d] = (D[d] & (m1 ^ full)) | (S[k] & m1)
+            if n:
+                j = 1
+                while j < n:
+                    D[dk + j] = S[sk + j]
+                    j += 1
+                D[dk + n] = (D[dk + n] & (m2 ^ full)) | (S[sk + n] & m2)
+        else:
+            for j in range(n + 1):
+                c = a0 + j
+                lo = 0
+                hi = 0
+                if c >= 0 and c < ss:
+                    k = sk + j
+                    if k < 0:
+                        k += sn
+                    lo = S[k]
+                if c + 1 >= 0 and c + 1 < ss:
+                    k = sk + j + 1
+                    if k < 0:
+                        k += sn
+                    hi = S[k]
+                word = (lo >> sh) | ((hi << back) & full)
+                m = full
+                if j == 0:
+                    m = m1
+                elif j == n:
+                    m = m2
+                d = dk + j
+                if d < 0:
+                    d += dn
+                D[d] = (D[d] & (m ^ full)) | (word & m)
+
+
 @micropython.viper
 def draw_pix(x: int, y: int, col: int):
-    buffer_data = ptr32(H_buffer_line)
-    total_bits = int(y * int(H_res) * int(BITS_PER_PIXEL) + x * int(BITS_PER_PIXEL))  # Bit position
-    word_index = total_bits // int(USABLE_BITS)
-    if word_index > 0:
-        word_index = word_index - 1
+    g = ptr32(_tgeom)
+    if x < g[5] or x >= g[7] or y < g[6] or y >= g[8]:
+        return
+    buffer_data = ptr32(_tdata)
+    wx = x // int(PIXELS_PER_WORD)
+    word_index = y * g[2] + wx + g[3]
+    if word_index < 0:
+        word_index += g[4]  # First pixel of the screen lives in the last word
+    bit_position = (x - wx * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL)
+    pixel_mask = int(PIXEL_BITMASK) << bit_position
+    color_bits = (col & int(PIXEL_BITMASK)) << bit_position
+    rop = col & int(ROP_MASK)
+    word = buffer_data[word_index]
+    if rop == int(ROP_COPY):
+        word = (word & (pixel_mask ^ 0x3FFFFFFF)) | color_bits  # Clear old, set new color or texture
+    elif rop == int(ROP_XOR):
+        word ^= color_bits
+    elif rop == int(ROP_OR):
+        word |= color_bits
     else:
-        word_index = int(len(H_buffer_line)) - 1
-    bit_position = total_bits % int(USABLE_BITS)  
-    pixel_clear_mask = ((int(PIXEL_BITMASK) << bit_position) ^ 0x3FFFFFFF) 
-    buffer_data[word_index] = (buffer_data[word_index] & pixel_clear_mask) | (col << bit_position)  # Clear old, set new color or texture
+        word &= color_bits | (pixel_mask ^ 0x3FFFFFFF)
+    buffer_data[word_index] = word
+
+@micropython.viper
+def get_pix(x: int, y: int) -> int:
+    # Color of pixel (x, y) of the target, 0 outside it
+    g = ptr32(_tgeom)
+    if x < 0 or y < 0 or x >= g[0] or y >= g[1]:
+        return 0
+    buffer_data = ptr32(_tdata)
+    wx = x // int(PIXELS_PER_WORD)
+    word_index = y * g[2] + wx + g[3]
+    if word_index < 0:
+        word_index += g[4]
+    return (buffer_data[word_index] >> ((x - wx * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL))) & int(PIXEL_BITMASK)
+
+@micropython.viper
+def read_row(y: int, buf):
+    # Copy scanline y into buf (array('L') of the target's stride, ROW_WORDS for the
+    # screen) as packed words: pixel x is at bits (x % 10) * 3 of buf[x // 10]. Returns buf.
+    g = ptr32(_tgeom)
+    if y < 0 or y >= g[1]:
+        raise ValueError("Row outside the target")
+    if int(len(buf)) < g[2]:
+        raise ValueError("Buffer shorter than a row")
+    Data = ptr32(_tdata)
+    dst = ptr32(buf)
+    k = y * g[2] + g[3]
+    for i in range(g[2]):
+        if k + i < 0:
+            dst[i] = Data[k + i + g[4]]  # First word of the screen lives at the end
+        else:
+            dst[i] = Data[k + i]
+    return buf
 
 @micropython.viper
 def fill_screen(col: int):
-    buffer_data = ptr32(H_buffer_line)
+    # Fills the whole target, or its clip rect when clipped
+    g = ptr32(_tgeom)
+    if g[5] > 0 or g[6] > 0 or g[7] < g[0] or g[8] < g[1]:
+        fill_rect(g[5], g[6], g[7], g[8], col)
+        return
+    buffer_data = ptr32(_tdata)
+    rop = col & int(ROP_MASK)
+    col &= int(PIXEL_BITMASK)
     color_pattern = 0  
     for i in range(int(PIXELS_PER_WORD)):
         color_pattern |= col << (int(BITS_PER_PIXEL) * i) 
-    for i in range(int(len(H_buffer_line))):
-        buffer_data[i] = color_pattern
+    n = g[4]
+    if rop == int(ROP_COPY):
+        for i in range(n):
+            buffer_data[i] = color_pattern
+    elif rop == int(ROP_XOR):
+        for i in range(n):
+            buffer_data[i] ^= color_pattern
+    elif rop == int(ROP_OR):
+        for i in range(n):
+            buffer_data[i] |= color_pattern
+    else:
+        for i in range(n):
+            buffer_data[i] &= color_pattern
 
 @micropython.viper
 def clear_region(x1: int, y1: int, x2: int, y2: int, col: int):
-
-    if y1 > y2:
-        y1, y2 = y2, y1
-    for y in range(y1, y2):
-        draw_fastHline(x1, x2, y, col)  # Fill each line
+    fill_rect(x1, y1, x2, y2, col)
 
 
 @micropython.viper
 def draw_fastHline(x1: int, x2: int, y: int, col: int):
-    if x1 < 0: x1 = 0
-    if x1 >= int(H_res): x1 = int(H_res) - 1
-    if x2 < 0: x2 = 0
-    if x2 >= int(H_res): x2 = int(H_res) - 1
-    if y < 0: y = 0
-    if y >= int(V_res): y = int(V_res) - 1
+    g = ptr32(_tgeom)
+    if y < g[6] or y >= g[8]:
+        return  # Off the clip rect
     if x2 < x1:
         x1, x2 = x2, x1
-    
-    Data = ptr32(H_buffer_line)
-    n1 = int(y * int(H_res) * int(bit_per_pix) + x1 * int(bit_per_pix))
-    n2 = int(y * int(H_res) * int(bit_per_pix) + x2 * int(bit_per_pix))
-    k1 = (n1 // int(usable_bits) - 1) if (n1 // int(usable_bits) > 0) else (int(len(H_buffer_line)) - 1)
-    k2 = (n2 // int(usable_bits) - 1) if (n2 // int(usable_bits) > 0) else (int(len(H_buffer_line)) - 1)
-    
-    if k2 == k1:
-        for i in range(x1, x2):
-            draw_pix(i, y, col)
+    if x1 < g[5]: x1 = g[5]
+    if x2 > g[7]: x2 = g[7]  # x2 is exclusive
+    if x2 <= x1:
         return
     
-    p1 = n1 % int(usable_bits)
-    p2 = n2 % int(usable_bits)
-    mask1off = 0
-    mask1col = 0
-    for i in range(p1 // int(bit_per_pix), int(pix_per_words)):
-        mask1off |= int(pixel_bitmask) << (int(bit_per_pix) * i)
-        mask1col |= col << (int(bit_per_pix) * i)
-    mask1off ^= 0x3FFFFFFF
-    
-    mask2off = 0
-    mask2col = 0
-    for i in range(0, p2 // int(bit_per_pix)):
-        mask2off |= int(pixel_bitmask) << (int(bit_per_pix) * i)
-        mask2col |= col << (int(bit_per_pix) * i)
-    mask2off ^= 0x3FFFFFFF
-    
-    Data[k1] = (Data[k1] & mask1off) | mask1col
-    Data[k2] = (Data[k2] & mask2off) | mask2col
+    Data = ptr32(_tdata)
+    w1 = x1 // int(pix_per_words)
+    w2 = x2 // int(pix_per_words)
+    p1 = (x1 - w1 * int(pix_per_words)) * int(bit_per_pix)
+    p2 = (x2 - w2 * int(pix_per_words)) * int(bit_per_pix)
+    k1 = y * g[2] + g[3] + w1
+    k2 = k1 + w2 - w1
+    mask1on = (0x3FFFFFFF >> p1) << p1  # Pixels x1 % 10 .. 9 of the first word
+    mask2on = (1 << p2) - 1  # Pixels 0 .. x2 % 10 - 1 of the last word
+    if k1 == k2:
+        mask1on &= mask2on
+        mask2on = 0
     
+    rop = col & int(ROP_MASK)
+    pat = (col >> int(PATTERN_SHIFT)) & 31
+    bg = (col >> int(BG_SHIFT)) & int(pixel_bitmask)
+    col &= int(pixel_bitmask)
     mask = 0
     for i in range(int(pix_per_words)):
         mask |= col << (int(bit_per_pix) * i)
+    mask1col = mask & mask1on
+    mask2col = mask & mask2on
     
     i = k1 + 1
-    if i > int(len(H_buffer_line)) - 1:
-        i = 0
-    while i < k2:
-        Data[i] = mask
-        i += 1
+    if k1 < 0:
+        k1 += g[4]  # First pixel of the screen lives in the last word
+    if pat:
+        # Pattern span: merge fg and bg through the pattern masks of this row, one
+        # color word per word column parity, then apply (word & keep) ^ flip
+        full = 0x3FFFFFFF
+        P = ptr32(_pattern_masks)
+        j = pat * int(PATTERN_WORDS) + (y & 7) * 2
+        bgw = 0
+        for b in range(int(pix_per_words)):
+            bgw |= bg << (int(bit_per_pix) * b)
+        ca = (mask & P[j]) | (bgw & (P[j] ^ full))  # Even word columns
+        cb = (mask & P[j + 1]) | (bgw & (P[j + 1] ^ full))  # Odd word columns
+        if w1 & 1:
+            ca, cb = cb, ca  # ca: column w1, cb: column w1 + 1
+        # keep = ~m | (m & S), S = (c & sc) | (~c & sn); flip = c & m & f
+        sc = 0
+        sn = 0
+        f = full
+        if rop == int(ROP_XOR):
+            sc = full
+            sn = full
+        elif rop == int(ROP_OR):
+            sn = full
+        elif rop == int(ROP_AND):
+            sc = full
+            f = 0
+        m = mask1on
+        Data[k1] = (Data[k1] & ((m ^ full) | (m & ((ca & sc) | ((ca ^ full) & sn))))) ^ (ca & m & f)
+        if rop == int(ROP_COPY):
+            while i < k2:
+                Data[i] = cb
+                i += 1
+                if i < k2:
+                    Data[i] = ca
+                    i += 1
+        else:
+            keep_b = (cb & sc) | ((cb ^ full) & sn)
+            keep_a = (ca & sc) | ((ca ^ full) & sn)
+            flip_b = cb & f
+            flip_a = ca & f
+            while i < k2:
+                Data[i] = (Data[i] & keep_b) ^ flip_b
+                i += 1
+                if i < k2:
+                    Data[i] = (Data[i] & keep_a) ^ flip_a
+                    i += 1
+        if mask2on:
+            c = ca if (w2 - w1) & 1 == 0 else cb
+            m = mask2on
+            Data[k2] = (Data[k2] & ((m ^ full) | (m & ((c & sc) | ((c ^ full) & sn))))) ^ (c & m & f)
+    elif rop == int(ROP_COPY):
+        Data[k1] = (Data[k1] & (mask1on ^ 0x3FFFFFFF)) | mask1col
+        while i < k2:
+            Data[i] = mask
+            i += 1
+        if mask2on:
+            Data[k2] = (Data[k2] & (mask2on ^ 0x3FFFFFFF)) | mask2col
+    elif rop == int(ROP_XOR):
+        Data[k1] ^= mask1col
+        while i < k2:
+            Data[i] ^= mask
+            i += 1
+        if mask2on:
+            Data[k2] ^= mask2col
+    elif rop == int(ROP_OR):
+        Data[k1] |= mask1col
+        while i < k2:
+            Data[i] |= mask
+            i += 1
+        if mask2on:
+            Data[k2] |= mask2col
+    else:
+        Data[k1] &= mask1col | (mask1on ^ 0x3FFFFFFF)
+        while i < k2:
+            Data[i] &= mask
+            i += 1
+        if mask2on:
+            Data[k2] &= mask2col | (mask2on ^ 0x3FFFFFFF)
 
 
 @micropython.viper
 def draw_fastVline(x: int, y1: int, y2: int, col: int):
-    if x < 0: x = 0
-    if x >= int(H_res): x = int(H_res) - 1
-    if y1 < 0: y1 = 0
-    if y1 >= int(V_res): y1 = int(V_res) - 1
-    if y2 < 0: y2 = 0
-    if y2 >= int(V_res): y2 = int(V_res) - 1
+    g = ptr32(_tgeom)
+    if x < g[5] or x >= g[7]:
+        return  # Off the clip rect
     if y2 < y1:
         y1, y2 = y2, y1
+    if y1 < g[6]: y1 = g[6]
+    if y2 > g[8]: y2 = g[8]  # y2 is exclusive
+    if y2 <= y1:
+        return
     
-    Data = ptr32(H_buffer_line)
-    n1 = int(y1 * int(H_res) * int(bit_per_pix) + x * int(bit_per_pix))
-    k1 = (n1 // int(usable_bits) - 1) if (n1 // int(usable_bits) > 0) else (int(len(H_buffer_line)) - 1)
-    p1 = n1 % int(usable_bits)
-    nword = int(len(H_buffer_line)) // int(V_res)
-    mask = (int(pixel_bitmask) << p1) ^ 0x3FFFFFFF
+    Data = ptr32(_tdata)
+    wx = x // int(pix_per_words)
+    p1 = (x - wx * int(pix_per_words)) * int(bit_per_pix)
+    nword = g[2]
+    k1 = y1 * nword + wx + g[3]
+    rop = col & int(ROP_MASK)
+    col_bits = (col & int(pixel_bitmask)) << p1
+    # Every raster op reduces to (word & keep) ^ flip
+    keep = (int(pixel_bitmask) << p1) ^ 0x3FFFFFFF
+    flip = col_bits
+    if rop == int(ROP_XOR):
+        keep = 0x3FFFFFFF
+    elif rop == int(ROP_OR):
+        keep = col_bits ^ 0x3FFFFFFF
+    elif rop == int(ROP_AND):
+        keep = keep | col_bits
+        flip = 0
     for i in range(y2 - y1):
-        Data[k1 + i * nword] = (Data[k1 + i * nword] & mask) | (col << p1)
+        k = k1 + i * nword
+        if k < 0:
+            k += g[4]
+        Data[k] = (Data[k] & keep) ^ flip
 
 @micropython.viper
 def fill_rect(x1: int, y1: int, x2: int, y2: int, col: int):
+    g = ptr32(_tgeom)
     y_min = y1 if y1 < y2 else y2
     y_max = y1 if y1 > y2 else y2
+    if y_min < g[6]: y_min = g[6]
+    if y_max > g[8]: y_max = g[8]
+    if (x1 if x1 > x2 else x2) <= g[5] or (x1 if x1 < x2 else x2) >= g[7]:
+        return
     j = y_min
     while j < y_max:
         draw_fastHline(x1, x2, j, col)
@@ -322,79 +697,323 @@ def fill_rect(x1: int, y1: int, x2: int, y2: int, col: int):
 
 @micropython.viper
 def draw_rect(x1: int, y1: int, x2: int, y2: int, col: int):
+    if x2 < x1:
+        x1, x2 = x2, x1
+    if y2 < y1:
+        y1, y2 = y2, y1
+    # Edges don't overlap, so an XOR rectangle drawn twice erases itself cleanly
+    if y2 == y1:
+        draw_fastHline(x1, x2 + 1, y1, col)
+        return
+    if x2 == x1:
+        draw_fastVline(x1, y1, y2 + 1, col)
+        return
     draw_fastHline(x1, x2, y1, col)
     draw_fastHline(x1, x2, y2, col)
-    draw_fastVline(x1, y1, y2, col)
-    draw_fastVline(x2, y1, y2, col)
+    draw_fastVline(x1, y1 + 1, y2, col)
+    draw_fastVline(x2, y1, y2 + 1, col)
+
+# Circles, ellipses and rounded rectangles
+# A shape is first reduced to a table of half-widths, one entry per row offset from
+# its center (circles walk a single octant and mirror it, 8-way symmetry). The table
+# is then drawn as one span per scanline when filled, or the two edge runs of each
+# scanline as an outline. Only rows on screen are visited and every span is clipped,
+# so partially visible shapes are drawn instead of rejected.
+_shape_widths = None  # Half-width table, grown on demand
+shape_stats = array('l', [0, 0])  # Spans and words written by the shape functions
+
+def _widths(n):
+    global _shape_widths
+    if _shape_widths is None or len(_shape_widths) < n + 2:
+        _shape_widths = array('H', range(n + 2 if n > 254 else 256))
+    return _shape_widths
 
 @micropython.viper
-def draw_circle(x: int, y: int, r: int, color: int):
-    if x < 0 or y < 0 or x >= int(H_res) or y >= int(V_res):
+def _hspan(x1: int, x2: int, y: int, col: int):
+    # Inclusive span, clipped to the screen
+    g = ptr32(_tgeom)
+    if y < g[6] or y >= g[8] or x2 < g[5] or x1 >= g[7] or x2 < x1:
         return
-    x_pos = -r
-    y_pos = 0
-    err = 2 - 2 * r
-    while 1:
-        draw_pix(x - x_pos, y + y_pos, color)
-        draw_pix(x - x_pos, y - y_pos, color)
-        draw_pix(x + x_pos, y + y_pos, color)
-        draw_pix(x + x_pos, y - y_pos, color)
-        e2 = err
-        if e2 <= y_pos:
-            y_pos += 1
-            err += y_pos * 2 + 1
-            if -x_pos == y_pos and e2 <= x_pos:
-                e2 = 0
-        if e2 > x_pos:
-            x_pos += 1
-            err += x_pos * 2 + 1
-        if x_pos > 0:
-            break
+    if x1 < g[5]: x1 = g[5]
+    if x2 >= g[7]: x2 = g[7] - 1
+    draw_fastHline(x1, x2 + 1, y, col)
+    stats = ptr32(shape_stats)
+    stats[0] += 1
+    stats[1] += x2 // int(pix_per_words) - x1 // int(pix_per_words) + 1
 
 @micropython.viper
-def fill_disk(x: int, y: int, r: int, color: int):
-    if x < 0 or y < 0 or x >= int(H_res) or y >= int(V_res):
+def _circle_widths(w, r: int):
+    # Midpoint circle over one octant; each step gives the width of row py and,
+    # when px steps inwards, the final width of row px
+    wp = ptr16(w)
+    px = r
+    py = 0
+    err = 1 - r
+    while px >= py:
+        wp[py] = px
+        if err < 0:
+            err += 2 * py + 3
+        else:
+            wp[px] = py
+            err += 2 * (py - px) + 5
+            px -= 1
+        py += 1
+
+def _ellipse_widths(w, rx, ry):
+    # Midpoint ellipse, both error terms scaled by 4 to stay in integers
+    if ry == 0:
+        w[0] = rx
         return
-    x_pos = -r
-    y_pos = 0
-    err = 2 - 2 * r
-    while 1:
-        draw_fastHline(x - x_pos, x + x_pos, y + y_pos, color)
-        draw_fastHline(x - x_pos, x + x_pos, y - y_pos, color)
-        e2 = err
-        if e2 <= y_pos:
-            y_pos += 1
-            err += y_pos * 2 + 1
-            if -x_pos == y_pos and e2 <= x_pos:
-                e2 = 0
-        if e2 > x_pos:
-            x_pos += 1
-            err += x_pos * 2 + 1
-        if x_pos > 0:
-            break
-
-
-collect()  # Run garbage collector to free memory 
-mem_before = mem_free()
+    rx2 = rx * rx
+    ry2 = ry * ry
+    x = 0
+    y = ry
+    dx = 0
+    dy = 2 * rx2 * y
+    p = 4 * ry2 - 4 * rx2 * ry + rx2
+    while dx < dy:  # Region 1: x advances every step
+        w[y] = x
+        x += 1
+        dx += 2 * ry2
+        if p < 0:
+            p += 4 * (ry2 + dx)
+        else:
+            y -= 1
+            dy -= 2 * rx2
+            p += 4 * (ry2 + dx - dy)
+    p = ry2 * (2 * x + 1) * (2 * x + 1) + 4 * rx2 * (y - 1) * (y - 1) - 4 * rx2 * ry2
+    while y >= 0:  # Region 2: y advances every step
+        w[y] = x
+        y -= 1
+        dy -= 2 * rx2
+        if p > 0:
+            p += 4 * (rx2 - dy)
+        else:
+            x += 1
+            dx += 2 * ry2
+            p += 4 * (rx2 - dy + dx)
+
+def _fill_rows(cx1, cy1, cx2, cy2, w, n, color):
+    # Rows above cy1 and below cy2 take their half-width from the table
+    y1 = max(cy1 - n, _tgeom[6])
+    y2 = min(cy2 + n, _tgeom[8] - 1)
+    for y in range(y1, y2 + 1):
+        if y < cy1:
+            hw = w[cy1 - y]
+        elif y > cy2:
+            hw = w[y - cy2]
+        else:
+            hw = w[0]
+        _hspan(cx1 - hw, cx2 + hw, y, color)
+
+def _outline_rows(cx1, cy1, cx2, cy2, w, n, color, span=_hspan):
+    # Each side of a row runs from the outer edge in to one past the next row outwards
+    y1 = max(cy1 - n, _tgeom[6])
+    y2 = min(cy2 + n, _tgeom[8] - 1)
+    for y in range(y1, y2 + 1):
+        if cy1 < y < cy2:
+            # Straight sides: always the two edge pixels, even when r is 0
+            hw = w[0]
+            span(cx1 - hw, cx1 - hw, y, color)
+            if cx2 + hw > cx1 - hw:
+                span(cx2 + hw, cx2 + hw, y, color)
+            continue
+        d = cy1 - y if y <= cy1 else y - cy2
+        hw = w[d]
+        if d == n:
+            span(cx1 - hw, cx2 + hw, y, color)  # Top or bottom edge
+        else:
+            inner = w[d + 1] + 1
+            if inner > hw:
+                inner = hw
+            span(cx1 - hw, cx1 - inner, y, color)
+            span(cx2 + inner, cx2 + hw, y, color)
+
+def draw_circle(x, y, r, color):
+    if _outside(x - r, y - r, x + r + 1, y + r + 1):
+        return
+    w = _widths(r)
+    _circle_widths(w, r)
+    _outline_rows(x, y, x, y, w, r, color)
 
-print("\n--- Frame Buffer Setup ---")
-print(f"Screen: {H_res}x{V_res} = {H_res * V_res} pixels")
-print(f"Each pixel: {BITS_PER_PIXEL} bits ({2**BITS_PER_PIXEL} colors)")
-print(f"Total: {H_res * V_res * BITS_PER_PIXEL} bits")
-print(f"Per word: {PIXELS_PER_WORD} pixels ({USABLE_BITS} bits)")
+def fill_disk(x, y, r, color):
+    if _outside(x - r, y - r, x + r + 1, y + r + 1):
+        return
+    w = _widths(r)
+    _circle_widths(w, r)
+    _fill_rows(x, y, x, y, w, r, color)
 
-total_pixels = int(H_res * V_res * BITS_PER_PIXEL / USABLE_BITS)
-print(f"Required: {total_pixels} words")
+def draw_ellipse(x, y, rx, ry, color):
+    if _outside(x - rx, y - ry, x + rx + 1, y + ry + 1):
+        return
+    w = _widths(ry)
+    _ellipse_widths(w, rx, ry)
+    _outline_rows(x, y, x, y, w, ry, color)
 
-H_buffer_line = array('L', (0 for _ in range(total_pixels)))  # Allocate array
-H_buffer_line_address = array('L', [addressof(H_buffer_line)])  # Get memory address for DMA
+def fill_ellipse(x, y, rx, ry, color):
+    if _outside(x - rx, y - ry, x + rx + 1, y + ry + 1):
+        return
+    w = _widths(ry)
+    _ellipse_widths(w, rx, ry)
+    _fill_rows(x, y, x, y, w, ry, color)
 
-mem_used = (mem_before - mem_free()) / 1024  # Calculate KB used
-mem_remaining = mem_free() / 1024
-print(f"\nFrame Buffer: {mem_used:.1f} KB used")
-print(f"RAM Remaining: {mem_remaining:.1f} KB\n")
+def _round_rect(x1, y1, x2, y2, r):
+    if x2 < x1:
+        x1, x2 = x2, x1
+    if y2 < y1:
+        y1, y2 = y2, y1
+    if _outside(x1, y1, x2 + 1, y2 + 1):
+        return None
+    r = min(r, (x2 - x1) // 2, (y2 - y1) // 2)
+    if r < 0:
+        r = 0
+    w = _widths(r)
+    _circle_widths(w, r)
+    return x1 + r, y1 + r, x2 - r, y2 - r, w, r
+
+def draw_round_rect(x1, y1, x2, y2, r, color):
+    # Corners are inclusive, like draw_rect
+    shape = _round_rect(x1, y1, x2, y2, r)
+    if shape:
+        cx1, cy1, cx2, cy2, w, r = shape
+        _outline_rows(cx1, cy1, cx2, cy2, w, r, color)
+
+def fill_round_rect(x1, y1, x2, y2, r, color):
+    shape = _round_rect(x1, y1, x2, y2, r)
+    if shape:
+        cx1, cy1, cx2, cy2, w, r = shape
+        _fill_rows(cx1, cy1, cx2, cy2, w, r, color)
+
+_arc_args = array('l', [0, 0, 0, 0, 0, 0, 0])  # Center x, y, start ray, end ray, sweep > 180
+_ARC_FAR = const(1 << 20)
+
+def _arc_span(x1, x2, row, color):
+    # Cut an outline run down to the part inside the sweep. For a fixed row, "counter-clockwise
+    # of the start ray" and "clockwise of the end ray" each hold on one side of an intercept,
+    # so each gives one range of x: the arc is their intersection (or union past 180 degrees).
+    a = _arc_args
+    cx = a[0]
+    sx = a[2]
+    sy = a[3]
+    ex = a[4]
+    ey = a[5]
+    dy = a[1] - row
+    # sx * dy - sy * dx >= 0
+    if sy > 0:
+        s1, s2 = -_ARC_FAR, sx * dy // sy
+    elif sy < 0:
+        s1, s2 = -(-sx * dy // sy), _ARC_FAR
+    else:
+        s1, s2 = (-_ARC_FAR, _ARC_FAR) if sx * dy >= 0 else (_ARC_FAR, -_ARC_FAR)
+    # dx * ey - dy * ex >= 0
+    if ey > 0:
+        e1, e2 = -(-dy * ex // ey), _ARC_FAR
+    elif ey < 0:
+        e1, e2 = -_ARC_FAR, dy * ex // ey
+    else:
+        e1, e2 = (-_ARC_FAR, _ARC_FAR) if -dy * ex >= 0 else (_ARC_FAR, -_ARC_FAR)
+    x1 -= cx
+    x2 -= cx
+    if not a[6]:
+        _hspan(cx + max(x1, s1, e1), cx + min(x2, s2, e2), row, color)
+        return
+    s1 = max(x1, s1)
+    s2 = min(x2, s2)
+    e1 = max(x1, e1)
+    e2 = min(x2, e2)
+    if s1 <= s2 and e1 <= e2 and s1 <= e2 + 1 and e1 <= s2 + 1:
+        _hspan(cx + min(s1, e1), cx + max(s2, e2), row, color)  # Overlapping, draw once
+    else:
+        _hspan(cx + s1, cx + s2, row, color)
+        _hspan(cx + e1, cx + e2, row, color)
 
-collect() # Run garbage collector to free memory again :p
+def draw_arc(x, y, r, start, end, color):
+    # Angles in degrees, counter-clockwise from 3 o'clock
+    sweep = (end - start) % 360
+    if _outside(x - r, y - r, x + r + 1, y + r + 1):
+        return
+    if sweep == 0:
+        draw_circle(x, y, r, color)
+        return
+    a = _arc_args
+    a[0] = x
+    a[1] = y
+    a[2] = int(cos(start * pi / 180) * 1024)
+    a[3] = int(sin(start * pi / 180) * 1024)
+    a[4] = int(cos(end * pi / 180) * 1024)
+    a[5] = int(sin(end * pi / 180) * 1024)
+    a[6] = sweep > 180
+    w = _widths(r)
+    _circle_widths(w, r)
+    _outline_rows(x, y, x, y, w, r, color, _arc_span)
+
+
+# Frame buffer and display start-up
+FRAME_WORDS = const(30720)  # 640 * 480 pixels * 3 bits / 30 bits per word
+
+H_buffer_line = None  # Frame buffer, allocated by init()
+H_buffer_line_address = None  # Frame buffer address for DMA
+paral_write_Hsync = None
+paral_write_Vsync = None
+paral_write_RGB = None
+
+def init(mode=None):
+    # Set the clock, allocate the frame buffer, claim PIO state machines 0-2 and start sync
+    global H_buffer_line, H_buffer_line_address, paral_write_Hsync, paral_write_Vsync, paral_write_RGB, screen
+    if H_buffer_line is not None:
+        return  # Already running
+    if mode is None:
+        mode = MODE_OVERCLOCK if OVCLK else MODE_NORMAL
+    if mode == MODE_OVERCLOCK:
+        mhz = set_freq(250_000_000)  # Boost CPU to 250 MHz
+        sm0_freq = 125875000  # SM0: Horizontal sync frequency
+        sm1_freq = 125000000  # SM1: Vertical sync frequency
+        sm2_freq = 113287500  # SM2: RGB data frequency
+    else:
+        mhz = set_freq(125_000_000)
+        sm0_freq = 25175000   # 25.175 MHz - VGA pixel clock for 640x480@60Hz
+        sm1_freq = 125000000  # 125 MHz - Sync timing clock
+        sm2_freq = 100700000  # 100.7 MHz - RGB data output clock
+    if mhz > 0:
+        print(f"CPU Speed: {mhz} MHz")
+    else:
+        print("ERROR: Frequency setting failed!")
+
+    collect()  # Run garbage collector to free memory 
+    mem_before = mem_free()
+    # range() has a length, so the array is allocated once at its final size (a generator
+    # grows it step by step). The contents are cleared by fill_screen() below.
+    H_buffer_line = array('L', range(FRAME_WORDS))
+    H_buffer_line_address = array('L', [addressof(H_buffer_line)])  # Get memory address for DMA
+    mem_used = (mem_before - mem_free()) / 1024  # Calculate KB used
+    print(f"Frame Buffer: {FRAME_WORDS} words, {mem_used:.1f} KB used, {mem_free() / 1024:.1f} KB remaining")
+    screen = Surface(H_res, V_res, H_buffer_line, ROW_WORDS, -1)
+    target(screen)
+
+    paral_write_Hsync = StateMachine(0, paral_Hsync, freq=sm0_freq, set_base=Pin(4))
+    paral_write_Vsync = StateMachine(1, paral_Vsync, freq=sm1_freq, sideset_base=Pin(5))
+    paral_write_RGB = StateMachine(2, paral_RGB, freq=sm2_freq, out_base=Pin(0), sideset_base=Pin(0))
+    fill_screen(BLACK)
+    configure_DMAs(FRAME_WORDS, H_buffer_line_address)
+    startsync()
+
+def deinit():
+    # Stop the display and give back the state machines, PIO program memory and frame buffer
+    global H_buffer_line, H_buffer_line_address, paral_write_Hsync, paral_write_Vsync, paral_write_RGB
+    global screen, _target, _tdata
+    if H_buffer_line is None:
+        return
+    stopsync()
+    paral_write_Hsync.active(0)
+    paral_write_Vsync.active(0)
+    paral_write_RGB.active(0)
+    PIO(0).remove_program()
+    paral_write_Hsync = paral_write_Vsync = paral_write_RGB = None
+    H_buffer_line = None
+    H_buffer_line_address = None
+    screen = _target = _tdata = None
+    set_freq(125_000_000)
+    collect()
 
 RED     = 0b001  # 1: Red only
 GREEN   = 0b010  # 2: Green only
@@ -405,142 +1024,367 @@ MAGENTA = 0b101  # 5: Red + Blue
 BLACK   = 0b000  # 0: All off
 WHITE   = 0b111  # 7: All on
 
-# Each character is 5 bytes wide, each byte represents a column of 8 pixels (LSB at top)
-FONT_5X7 = {
-    ' ': [0x00, 0x00, 0x00, 0x00, 0x00],
-    '!': [0x00, 0x00, 0x5F, 0x00, 0x00],
-    '"': [0x00, 0x07, 0x00, 0x07, 0x00],
-    '#': [0x14, 0x7F, 0x14, 0x7F, 0x14],
-    '$': [0x24, 0x2A, 0x7F, 0x2A, 0x12],
-    '%': [0x23, 0x13, 0x08, 0x64, 0x62],
-    '&': [0x36, 0x49, 0x55, 0x22, 0x50],
-    "'": [0x00, 0x05, 0x03, 0x00, 0x00],
-    '(': [0x00, 0x1C, 0x22, 0x41, 0x00],
-    ')': [0x00, 0x41, 0x22, 0x1C, 0x00],
-    '*': [0x14, 0x08, 0x3E, 0x08, 0x14],
-    '+': [0x08, 0x08, 0x3E, 0x08, 0x08],
-    ',': [0x00, 0x50, 0x30, 0x00, 0x00],
-    '-': [0x08, 0x08, 0x08, 0x08, 0x08],
-    '.': [0x00, 0x60, 0x60, 0x00, 0x00],
-    '/': [0x20, 0x10, 0x08, 0x04, 0x02],
-    '0': [0x3E, 0x51, 0x49, 0x45, 0x3E],
-    '1': [0x00, 0x42, 0x7F, 0x40, 0x00],
-    '2': [0x42, 0x61, 0x51, 0x49, 0x46],
-    '3': [0x21, 0x41, 0x45, 0x4B, 0x31],
-    '4': [0x18, 0x14, 0x12, 0x7F, 0x10],
-    '5': [0x27, 0x45, 0x45, 0x45, 0x39],
-    '6': [0x3C, 0x4A, 0x49, 0x49, 0x30],
-    '7': [0x01, 0x71, 0x09, 0x05, 0x03],
-    '8': [0x36, 0x49, 0x49, 0x49, 0x36],
-    '9': [0x06, 0x49, 0x49, 0x29, 0x1E],
-    ':': [0x00, 0x36, 0x36, 0x00, 0x00],
-    ';': [0x00, 0x56, 0x36, 0x00, 0x00],
-    '<': [0x08, 0x14, 0x22, 0x41, 0x00],
-    '=': [0x14, 0x14, 0x14, 0x14, 0x14],
-    '>': [0x00, 0x41, 0x22, 0x14, 0x08],
-    '?': [0x02, 0x01, 0x51, 0x09, 0x06],
-    '@': [0x32, 0x49, 0x79, 0x41, 0x3E],
-    'A': [0x7E, 0x11, 0x11, 0x11, 0x7E],
-    'B': [0x7F, 0x49, 0x49, 0x49, 0x36],
-    'C': [0x3E, 0x41, 0x41, 0x41, 0x22],
-    'D': [0x7F, 0x41, 0x41, 0x22, 0x1C],
-    'E': [0x7F, 0x49, 0x49, 0x49, 0x41],
-    'F': [0x7F, 0x09, 0x09, 0x09, 0x01],
-    'G': [0x3E, 0x41, 0x49, 0x49, 0x7A],
-    'H': [0x7F, 0x08, 0x08, 0x08, 0x7F],
-    'I': [0x00, 0x41, 0x7F, 0x41, 0x00],
-    'J': [0x20, 0x40, 0x41, 0x3F, 0x01],
-    'K': [0x7F, 0x08, 0x14, 0x22, 0x41],
-    'L': [0x7F, 0x40, 0x40, 0x40, 0x40],
-    'M': [0x7F, 0x02, 0x0C, 0x02, 0x7F],
-    'N': [0x7F, 0x04, 0x08, 0x10, 0x7F],
-    'O': [0x3E, 0x41, 0x41, 0x41, 0x3E],
-    'P': [0x7F, 0x09, 0x09, 0x09, 0x06],
-    'Q': [0x3E, 0x41, 0x51, 0x21, 0x5E],
-    'R': [0x7F, 0x09, 0x19, 0x29, 0x46],
-    'S': [0x46, 0x49, 0x49, 0x49, 0x31],
-    'T': [0x01, 0x01, 0x7F, 0x01, 0x01],
-    'U': [0x3F, 0x40, 0x40, 0x40, 0x3F],
-    'V': [0x1F, 0x20, 0x40, 0x20, 0x1F],
-    'W': [0x3F, 0x40, 0x38, 0x40, 0x3F],
-    'X': [0x63, 0x14, 0x08, 0x14, 0x63],
-    'Y': [0x07, 0x08, 0x70, 0x08, 0x07],
-    'Z': [0x61, 0x51, 0x49, 0x45, 0x43],
-    '[': [0x00, 0x7F, 0x41, 0x41, 0x00],
-    '\\': [0x02, 0x04, 0x08, 0x10, 0x20],
-    ']': [0x00, 0x41, 0x41, 0x7F, 0x00],
-    '^': [0x04, 0x02, 0x01, 0x02, 0x04],
-    '_': [0x40, 0x40, 0x40, 0x40, 0x40],
-    '`': [0x00, 0x01, 0x02, 0x04, 0x00],
-    'a': [0x20, 0x54, 0x54, 0x54, 0x78],
-    'b': [0x7F, 0x48, 0x44, 0x44, 0x38],
-    'c': [0x38, 0x44, 0x44, 0x44, 0x20],
-    'd': [0x38, 0x44, 0x44, 0x48, 0x7F],
-    'e': [0x38, 0x54, 0x54, 0x54, 0x18],
-    'f': [0x08, 0x7E, 0x09, 0x01, 0x02],
-    'g': [0x0C, 0x52, 0x52, 0x52, 0x3E],
-    'h': [0x7F, 0x08, 0x04, 0x04, 0x78],
-    'i': [0x00, 0x44, 0x7D, 0x40, 0x00],
-    'j': [0x20, 0x40, 0x44, 0x3D, 0x00],
-    'k': [0x7F, 0x10, 0x28, 0x44, 0x00],
-    'l': [0x00, 0x41, 0x7F, 0x40, 0x00],
-    'm': [0x7C, 0x04, 0x18, 0x04, 0x78],
-    'n': [0x7C, 0x08, 0x04, 0x04, 0x78],
-    'o': [0x38, 0x44, 0x44, 0x44, 0x38],
-    'p': [0x7C, 0x14, 0x14, 0x14, 0x08],
-    'q': [0x08, 0x14, 0x14, 0x18, 0x7C],
-    'r': [0x7C, 0x08, 0x04, 0x04, 0x08],
-    's': [0x48, 0x54, 0x54, 0x54, 0x20],
-    't': [0x04, 0x3F, 0x44, 0x40, 0x20],
-    'u': [0x3C, 0x40, 0x40, 0x20, 0x7C],
-    'v': [0x1C, 0x20, 0x40, 0x20, 0x1C],
-    'w': [0x3C, 0x40, 0x30, 0x40, 0x3C],
-    'x': [0x44, 0x28, 0x10, 0x28, 0x44],
-    'y': [0x0C, 0x50, 0x50, 0x50, 0x3C],
-    'z': [0x44, 0x64, 0x54, 0x4C, 0x44],
-    '{': [0x00, 0x08, 0x36, 0x41, 0x00],
-    '|': [0x00, 0x00, 0x7F, 0x00, 0x00],
-    '}': [0x00, 0x41, 0x36, 0x08, 0x00],
-    '~': [0x08, 0x04, 0x08, 0x10, 0x08],
-}
-
-
-
-def draw_char(x, y, char, color, scale=1):
-
-    if char not in FONT_5X7:
-        return
-        
-    bitmap = FONT_5X7[char]
-    
-    # Iterate through each column of the character
-    for col in range(5):
-        # Iterate through each row
-        for row in range(8):
-            # Check if pixel is set in bitmap
-            if bitmap[col] & (1 << row):
-                # Draw scaled pixel
-                for sx in range(scale):
-                    for sy in range(scale):
-                        px = x + col * scale + sx
-                        py = y + row * scale + sy
-                        if 0 <= px < H_res and 0 <= py < V_res:
-                            draw_pix(px, py, color)
-
-
-def draw_text(x, y, text, color, scale=1):
+# Each character is 5 bytes wide, each byte represents a column of 8 pixels (LSB at top).
+# One contiguous blob indexed by code point: glyph for c starts at (ord(c) - 32) * 5
+FONT_5X7 = (
+    b'\x00\x00\x00\x00\x00'  # space
+    b'\x00\x00\x5F\x00\x00'  # !
+    b'\x00\x07\x00\x07\x00'  # "
+    b'\x14\x7F\x14\x7F\x14'  # #
+    b'\x24\x2A\x7F\x2A\x12'  # $
+    b'\x23\x13\x08\x64\x62'  # %
+    b'\x36\x49\x55\x22\x50'  # &
+    b'\x00\x05\x03\x00\x00'  # '
+    b'\x00\x1C\x22\x41\x00'  # (
+    b'\x00\x41\x22\x1C\x00'  # )
+    b'\x14\x08\x3E\x08\x14'  # *
+    b'\x08\x08\x3E\x08\x08'  # +
+    b'\x00\x50\x30\x00\x00'  # ,
+    b'\x08\x08\x08\x08\x08'  # -
+    b'\x00\x60\x60\x00\x00'  # .
+    b'\x20\x10\x08\x04\x02'  # /
+    b'\x3E\x51\x49\x45\x3E'  # 0
+    b'\x00\x42\x7F\x40\x00'  # 1
+    b'\x42\x61\x51\x49\x46'  # 2
+    b'\x21\x41\x45\x4B\x31'  # 3
+    b'\x18\x14\x12\x7F\x10'  # 4
+    b'\x27\x45\x45\x45\x39'  # 5
+    b'\x3C\x4A\x49\x49\x30'  # 6
+    b'\x01\x71\x09\x05\x03'  # 7
+    b'\x36\x49\x49\x49\x36'  # 8
+    b'\x06\x49\x49\x29\x1E'  # 9
+    b'\x00\x36\x36\x00\x00'  # :
+    b'\x00\x56\x36\x00\x00'  # ;
+    b'\x08\x14\x22\x41\x00'  # <
+    b'\x14\x14\x14\x14\x14'  # =
+    b'\x00\x41\x22\x14\x08'  # >
+    b'\x02\x01\x51\x09\x06'  # ?
+    b'\x32\x49\x79\x41\x3E'  # @
+    b'\x7E\x11\x11\x11\x7E'  # A
+    b'\x7F\x49\x49\x49\x36'  # B
+    b'\x3E\x41\x41\x41\x22'  # C
+    b'\x7F\x41\x41\x22\x1C'  # D
+    b'\x7F\x49\x49\x49\x41'  # E
+    b'\x7F\x09\x09\x09\x01'  # F
+    b'\x3E\x41\x49\x49\x7A'  # G
+    b'\x7F\x08\x08\x08\x7F'  # H
+    b'\x00\x41\x7F\x41\x00'  # I
+    b'\x20\x40\x41\x3F\x01'  # J
+    b'\x7F\x08\x14\x22\x41'  # K
+    b'\x7F\x40\x40\x40\x40'  # L
+    b'\x7F\x02\x0C\x02\x7F'  # M
+    b'\x7F\x04\x08\x10\x7F'  # N
+    b'\x3E\x41\x41\x41\x3E'  # O
+    b'\x7F\x09\x09\x09\x06'  # P
+    b'\x3E\x41\x51\x21\x5E'  # Q
+    b'\x7F\x09\x19\x29\x46'  # R
+    b'\x46\x49\x49\x49\x31'  # S
+    b'\x01\x01\x7F\x01\x01'  # T
+    b'\x3F\x40\x40\x40\x3F'  # U
+    b'\x1F\x20\x40\x20\x1F'  # V
+    b'\x3F\x40\x38\x40\x3F'  # W
+    b'\x63\x14\x08\x14\x63'  # X
+    b'\x07\x08\x70\x08\x07'  # Y
+    b'\x61\x51\x49\x45\x43'  # Z
+    b'\x00\x7F\x41\x41\x00'  # [
+    b'\x02\x04\x08\x10\x20'  # \
+    b'\x00\x41\x41\x7F\x00'  # ]
+    b'\x04\x02\x01\x02\x04'  # ^
+    b'\x40\x40\x40\x40\x40'  # _
+    b'\x00\x01\x02\x04\x00'  # `
+    b'\x20\x54\x54\x54\x78'  # a
+    b'\x7F\x48\x44\x44\x38'  # b
+    b'\x38\x44\x44\x44\x20'  # c
+    b'\x38\x44\x44\x48\x7F'  # d
+    b'\x38\x54\x54\x54\x18'  # e
+    b'\x08\x7E\x09\x01\x02'  # f
+    b'\x0C\x52\x52\x52\x3E'  # g
+    b'\x7F\x08\x04\x04\x78'  # h
+    b'\x00\x44\x7D\x40\x00'  # i
+    b'\x20\x40\x44\x3D\x00'  # j
+    b'\x7F\x10\x28\x44\x00'  # k
+    b'\x00\x41\x7F\x40\x00'  # l
+    b'\x7C\x04\x18\x04\x78'  # m
+    b'\x7C\x08\x04\x04\x78'  # n
+    b'\x38\x44\x44\x44\x38'  # o
+    b'\x7C\x14\x14\x14\x08'  # p
+    b'\x08\x14\x14\x18\x7C'  # q
+    b'\x7C\x08\x04\x04\x08'  # r
+    b'\x48\x54\x54\x54\x20'  # s
+    b'\x04\x3F\x44\x40\x20'  # t
+    b'\x3C\x40\x40\x20\x7C'  # u
+    b'\x1C\x20\x40\x20\x1C'  # v
+    b'\x3C\x40\x30\x40\x3C'  # w
+    b'\x44\x28\x10\x28\x44'  # x
+    b'\x0C\x50\x50\x50\x3C'  # y
+    b'\x44\x64\x54\x4C\x44'  # z
+    b'\x00\x08\x36\x41\x00'  # {
+    b'\x00\x00\x7F\x00\x00'  # |
+    b'\x00\x41\x36\x08\x00'  # }
+    b'\x08\x04\x08\x10\x08'  # ~
+)
+
+
+
+# Bitmap fonts
+# Glyphs are stored column-major, (height + 7) // 8 bytes per column with the LSB at the top
+# (the FONT_5X7 layout). Widths may differ per glyph for proportional fonts.
+#
+# Font file layout (.pvf):
+#   b'PVF' magic, version byte (1)
+#   height, first code point, glyph count, spacing (1 byte each)
+#   glyph widths (count bytes, 0 = missing glyph)
+#   glyph columns, in code point order
+FONT_MAGIC = b'PVF\x01'
+
+class BitmapFont:
+    _next_id = 0
+
+    def __init__(self, height, first, widths, data, spacing=1):
+        self.height = height
+        self.first = first
+        self.count = len(widths)
+        self.widths = bytes(widths)
+        self.data = bytes(data)
+        self.spacing = spacing
+        self.col_bytes = (height + 7) // 8
+        self.offsets = array('H', bytearray(2 * self.count))
+        offset = 0
+        for i in range(self.count):
+            self.offsets[i] = offset
+            offset += self.widths[i] * self.col_bytes
+        self.id = BitmapFont._next_id  # Part of the glyph cache key
+        BitmapFont._next_id += 1
 
+    @staticmethod
+    def from_dict(glyphs, height=8, spacing=1):
+        # Build from a {char: [column, ...]} dict like FONT_5X7
+        codes = [ord(c) for c in glyphs]
+        first = min(codes)
+        widths = bytearray(max(codes) - first + 1)
+        for c in glyphs:
+            widths[ord(c) - first] = len(glyphs[c])
+        data = bytearray()
+        for i in range(len(widths)):
+            for column in glyphs.get(chr(first + i), ()):
+                for b in range((height + 7) // 8):
+                    data.append((column >> (8 * b)) & 0xFF)
+        return BitmapFont(height, first, widths, data, spacing)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(FONT_MAGIC)
+            f.write(bytes((self.height, self.first, self.count, self.spacing)))
+            f.write(self.widths)
+            f.write(self.data)
+
+    def glyph(self, char):
+        # Index of a glyph, or -1 when the font doesn't have it
+        code = ord(char) - self.first
+        if code < 0 or code >= self.count or not self.widths[code]:
+            return -1
+        return code
+
+    def column(self, code, col):
+        offset = self.offsets[code] + col * self.col_bytes
+        bits = 0
+        for b in range(self.col_bytes):
+            bits |= self.data[offset + b] << (8 * b)
+        return bits
+
+    def advance(self, char, scale=1):
+        code = self.glyph(char)
+        if code < 0:
+            code = self.glyph(' ')
+            if code < 0:
+                return 0
+        return (self.widths[code] + self.spacing) * scale
+
+
+def load_font(path):
+    with open(path, 'rb') as f:
+        if f.read(4) != FONT_MAGIC:
+            raise ValueError("Not a PVF font file")
+        height, first, count, spacing = f.read(4)
+        widths = f.read(count)
+        data = f.read()
+    return BitmapFont(height, first, widths, data, spacing)
+
+
+# Glyph cache
+# Rendered glyphs are kept as packed pixel mask words per row, keyed by (font, char,
+# scale, bit alignment), so a cached character is a few word writes instead of one
+# draw_pix per pixel. The color is applied while blitting (mask & color pattern), so
+# one entry serves every color. Least recently used glyphs are evicted once the
+# cache grows past its byte budget.
+class Glyph:
+    def __init__(self, nwords, rows):
+        self.nwords = nwords
+        self.rows = rows
+        self.mask = array('L', bytearray(4 * nwords * rows))  # 0b111 per lit pixel
+        self.size = 4 * nwords * rows + 48  # Approximate heap cost with object overhead
+        self.used = 0
+
+
+class GlyphCache:
+    def __init__(self, budget=8192):
+        self.budget = budget
+        self.glyphs = {}
+        self.size = 0
+        self.tick = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.glyphs = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def _render(self, font, code, scale, align):
+        width = font.widths[code]
+        rows = font.height * scale
+        nwords = (align + width * scale + PIXELS_PER_WORD - 1) // PIXELS_PER_WORD
+        g = Glyph(nwords, rows)
+        for col in range(width):
+            bits = font.column(code, col)
+            for row in range(font.height):
+                if bits & (1 << row):
+                    for sx in range(scale):
+                        px = align + col * scale + sx
+                        i = px // PIXELS_PER_WORD
+                        shift = BITS_PER_PIXEL * (px % PIXELS_PER_WORD)
+                        for sy in range(scale):
+                            g.mask[(row * scale + sy) * nwords + i] |= PIXEL_BITMASK << shift
+        return g
+
+    def _evict(self):
+        while self.size > self.budget and len(self.glyphs) > 1:
+            oldest = None
+            for key in self.glyphs:
+                if oldest is None or self.glyphs[key].used < self.glyphs[oldest].used:
+                    oldest = key
+            self.size -= self.glyphs.pop(oldest).size
+
+    def draw(self, font, char, x, y, color, scale):
+        # Draw one character, returns the x advance
+        if not 0 < scale < 32:
+            raise ValueError("Scale must be 1-31")  # It has 5 bits in the cache key
+        code = font.glyph(char)
+        if code < 0:
+            return font.advance(char, scale)
+        advance = (font.widths[code] + font.spacing) * scale
+        right = x + font.widths[code] * scale
+        bottom = y + font.height * scale
+        clip = _tgeom
+        if x >= clip[7] or right <= clip[5] or y >= clip[8] or bottom <= clip[6]:
+            return advance  # Trivial reject
+        inside = x >= clip[5] and right <= clip[7] and y >= clip[6] and bottom <= clip[8]
+        wx = x // PIXELS_PER_WORD
+        align = x - wx * PIXELS_PER_WORD
+        key = (((font.id << 8 | code) << 5 | scale) << 4) | align
+        g = self.glyphs.get(key)
+        if g is None:
+            self.misses += 1
+            g = self._render(font, code, scale, align)
+            self.glyphs[key] = g
+            self.size += g.size
+            self.tick += 1
+            g.used = self.tick
+            self._evict()
+        else:
+            self.hits += 1
+            self.tick += 1
+            g.used = self.tick
+        _blit_glyph(g, wx, y, color, inside)
+        return advance
+
+
+@micropython.viper
+def _blit_glyph(g, wx: int, y: int, col: int, inside: int):
+    # inside: the glyph lies within the clip rect, so no word needs clipping
+    src = ptr32(g.mask)
+    nw = int(g.nwords)
+    g_ = ptr32(_tgeom)
+    Data = ptr32(_tdata)
+    nword = g_[4]
+    stride = g_[2]
+    rop = col & int(ROP_MASK)
+    col &= int(PIXEL_BITMASK)
+    pattern = 0
+    for p in range(int(PIXELS_PER_WORD)):
+        pattern |= col << (int(BITS_PER_PIXEL) * p)
+    # Word columns holding the left and right clip edges, and the pixels they keep
+    lw = g_[5] // int(PIXELS_PER_WORD)
+    p = (g_[5] - lw * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL)
+    lm = (0x3FFFFFFF >> p) << p
+    rw = (g_[7] - 1) // int(PIXELS_PER_WORD)
+    p = (g_[7] - rw * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL)
+    rm = 0x3FFFFFFF >> (int(USABLE_BITS) - p)
+    r0 = 0
+    r1 = int(g.rows)
+    if not inside:
+        if y + r0 < g_[6]:
+            r0 = g_[6] - y
+        if y + r1 > g_[8]:
+            r1 = g_[8] - y
+    i = r0 * nw
+    for r in range(r0, r1):
+        k = (y + r) * stride + wx + g_[3]
+        for j in range(nw):
+            m = src[i + j]
+            if not inside:
+                c = wx + j
+                if c < lw or c > rw:
+                    m = 0
+                else:
+                    if c == lw:
+                        m &= lm
+                    if c == rw:
+                        m &= rm
+            if m:
+                d = m & pattern
+                kk = k + j
+                if kk < 0:
+                    kk += nword
+                word = Data[kk]
+                if rop == int(ROP_COPY):
+                    word = (word & (m ^ 0x3FFFFFFF)) | d
+                elif rop == int(ROP_XOR):
+                    word ^= d
+                elif rop == int(ROP_OR):
+                    word |= d
+                else:
+                    word &= d | (m ^ 0x3FFFFFFF)
+                Data[kk] = word
+        i += nw
+
+
+default_font = BitmapFont(8, 32, b'\x05' * 95, FONT_5X7)
+glyph_cache = GlyphCache()
+
+def draw_char(x, y, char, color, scale=1, font=None):
+    # Returns the x advance of the character
+    return glyph_cache.draw(font or default_font, char, x, y, color, scale)
+
+
+def draw_text(x, y, text, color, scale=1, font=None):
+
+    font = font or default_font
     cx = x  # Current X position
     
     for char in text:
         if char == '\n':
             # Move to next line
-            y += 8 * scale + 2 * scale
+            y += (font.height + 2) * scale
             cx = x
         else:
             # Draw character and advance cursor
-            draw_char(cx, y, char, color, scale)
-            cx += 6 * scale  # 5 pixels + 1 spacing
+            cx += glyph_cache.draw(font, char, cx, y, color, scale)
 
 
 # 3D Matrix
@@ -585,13 +1429,15 @@ def project_3d(x, y, z, distance=4):
     return screen_x, screen_y
 
 def draw_line(x1, y1, x2, y2, color):
+    # draw_pix clips each pixel; lines missing the clip rect are rejected up front
+    if _outside(min(x1, x2), min(y1, y2), max(x1, x2) + 1, max(y1, y2) + 1):
+        return
     dx, dy = abs(x2 - x1), abs(y2 - y1)
     sx = 1 if x1 < x2 else -1
     sy = 1 if y1 < y2 else -1
     err = dx - dy
     while True:
-        if 0 <= x1 < H_res and 0 <= y1 < V_res:
-            draw_pix(x1, y1, color)
+        draw_pix(x1, y1, color)
         if x1 == x2 and y1 == y2:
             break
         e2 = 2 * err
@@ -604,15 +1450,19 @@ def draw_line(x1, y1, x2, y2, color):
 
 def fill_triangle(x1, y1, x2, y2, x3, y3, color):
     if y1 > y2:
-        x1, y1, x2, y2 = x2, y2, x1, y1
+        x1, x2 = x2, x1  # Pairwise swaps, a 4-tuple swap would allocate
+        y1, y2 = y2, y1
     if y1 > y3:
-        x1, y1, x3, y3 = x3, y3, x1, y1
+        x1, x3 = x3, x1
+        y1, y3 = y3, y1
     if y2 > y3:
-        x2, y2, x3, y3 = x3, y3, x2, y2
-    if y3 < 0 or y1 >= V_res:
+        x2, x3 = x3, x2
+        y2, y3 = y3, y2
+    if _outside(min(x1, x2, x3), y1, max(x1, x2, x3) + 1, y3 + 1):
         return
-    y_start = max(0, y1)
-    y_end = min(V_res - 1, y3)
+    # Only rows inside the clip rect are walked; draw_fastHline clips each span in x
+    y_start = max(_tgeom[6], y1)
+    y_end = min(_tgeom[8] - 1, y3)
     for y in range(y_start, y_end + 1):
         if y < y2:
             xa = x1 if y2 == y1 else x1 + (x2 - x1) * (y - y1) // (y2 - y1)
@@ -620,296 +1470,663 @@ def fill_triangle(x1, y1, x2, y2, x3, y3, color):
         else:
             xa = x2 if y3 == y2 else x2 + (x3 - x2) * (y - y2) // (y3 - y2)
             xb = x1 if y3 == y1 else x1 + (x3 - x1) * (y - y1) // (y3 - y1)
-        if xa > xb:
-            xa, xb = xb, xa
-        xa = max(0, min(H_res - 1, xa))
-        xb = max(0, min(H_res - 1, xb))
         draw_fastHline(xa, xb, y, color)
 
 
 
+# Tile map + hardware-style sprite layer
+# Tiles are kept pre-packed in the frame buffer format (10 pixels per 30-bit word),
+# so a tile row is copied with whole word writes. Tile width must therefore be a
+# multiple of 10 pixels (10x8, 20x16, ...) and the map must start on a word boundary.
+MAX_SPRITES = const(8)
+
+class TileSet:
+    def __init__(self, tile_w, tile_h, count, transparent=BLACK):
+        if tile_w % PIXELS_PER_WORD:
+            raise ValueError("Tile width must be a multiple of 10")
+        self.tile_w = tile_w
+        self.tile_h = tile_h
+        self.count = count
+        self.transparent = transparent  # Color treated as see-through when used by a sprite
+        self.row_words = tile_w // PIXELS_PER_WORD
+        self.tile_words = self.row_words * tile_h
+        self.data = array('L', bytearray(4 * self.tile_words * count))  # Packed pixels
+        self.mask = array('L', bytearray(4 * self.tile_words * count))  # 0b111 per opaque pixel
+
+    def _opaque_mask(self, word):
+        mask = 0
+        for i in range(PIXELS_PER_WORD):
+            if (word >> (BITS_PER_PIXEL * i)) & PIXEL_BITMASK != self.transparent:
+                mask |= PIXEL_BITMASK << (BITS_PER_PIXEL * i)
+        return mask
+
+    def set_tile(self, index, rows):
+        # rows: tile_h sequences of tile_w color values
+        k = index * self.tile_words
+        for row in rows:
+            for w in range(self.row_words):
+                word = 0
+                for i in range(PIXELS_PER_WORD):
+                    word |= row[w * PIXELS_PER_WORD + i] << (BITS_PER_PIXEL * i)
+                self.data[k] = word
+                self.mask[k] = self._opaque_mask(word)
+                k += 1
+
+    def grab(self, index, x, y):
+        # Copy a tile sized block of the target into a tile (x must be a multiple of 10),
+        # handy for turning draw_text output into tiles
+        k = index * self.tile_words
+        nword = _tgeom[4]
+        for row in range(self.tile_h):
+            src = (y + row) * _tgeom[2] + x // PIXELS_PER_WORD + _tgeom[3]
+            for w in range(self.row_words):
+                word = _tdata[(src + w) % nword]
+                self.data[k] = word
+                self.mask[k] = self._opaque_mask(word)
+                k += 1
+
+
+class Sprite:
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.tile = 0
+        self.visible = False
+        self.changed = False
+        self.drawn = False  # True when composited at (drawn_x, drawn_y)
+        self.drawn_x = 0
+        self.drawn_y = 0
+
+
+class TileMap:
+    def __init__(self, tileset, cols, rows, x=0, y=0):
+        if x % PIXELS_PER_WORD:
+            raise ValueError("Map x must be a multiple of 10")
+        self.tileset = tileset
+        self.cols = cols
+        self.rows = rows
+        self.x = x
+        self.y = y
+        self.word_x = x // PIXELS_PER_WORD
+        self.cells = bytearray(cols * rows)
+        self.dirty = bytearray(cols * rows)
+        self.sprites = [Sprite() for _ in range(MAX_SPRITES)]
+        self.invalidate()
+
+    def invalidate(self):
+        # Force a full repaint on the next render()
+        for i in range(len(self.dirty)):
+            self.dirty[i] = 1
+        for s in self.sprites:
+            s.changed = s.visible
+
+    def set_tile(self, col, row, tile):
+        i = row * self.cols + col
+        if self.cells[i] != tile:
+            self.cells[i] = tile
+            self.dirty[i] = 1
+
+    def fill(self, tile):
+        for i in range(len(self.cells)):
+            if self.cells[i] != tile:
+                self.cells[i] = tile
+                self.dirty[i] = 1
+
+    def set_sprite(self, index, x, y, tile=None):
+        s = self.sprites[index]
+        if tile is None:
+            tile = s.tile
+        if not s.visible or s.x != x or s.y != y or s.tile != tile:
+            s.x = x
+            s.y = y
+            s.tile = tile
+            s.visible = True
+            s.changed = True
+
+    def hide_sprite(self, index):
+        s = self.sprites[index]
+        if s.visible:
+            s.visible = False
+            s.changed = True
+
+    def _tile_range(self, x, y):
+        # Tiles covered by a tile sized sprite at (x, y), clamped to the map
+        ts = self.tileset
+        c1 = max(0, (x - self.x) // ts.tile_w)
+        c2 = min(self.cols - 1, (x - self.x + ts.tile_w - 1) // ts.tile_w)
+        r1 = max(0, (y - self.y) // ts.tile_h)
+        r2 = min(self.rows - 1, (y - self.y + ts.tile_h - 1) // ts.tile_h)
+        return c1, c2, r1, r2
+
+    def _mark(self, x, y):
+        c1, c2, r1, r2 = self._tile_range(x, y)
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                self.dirty[r * self.cols + c] = 1
+
+    def _touches_dirty(self, x, y):
+        c1, c2, r1, r2 = self._tile_range(x, y)
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                if self.dirty[r * self.cols + c]:
+                    return True
+        return False
+
+    def render(self):
+        # Repaint only dirty tiles, then re-composite the sprites sitting on them.
+        # Returns the number of tiles repainted.
+        sprites = self.sprites
+        for s in sprites:
+            if s.changed:
+                if s.drawn:
+                    self._mark(s.drawn_x, s.drawn_y)  # Uncovered background
+                if s.visible:
+                    self._mark(s.x, s.y)
+        # A sprite touching a repainted tile is redrawn whole, so its footprint must be
+        # repainted too (otherwise overlapping sprites would be overdrawn in the wrong order)
+        redraw = 0
+        grown = True
+        while grown:
+            grown = False
+            for i in range(MAX_SPRITES):
+                s = sprites[i]
+                if s.visible and not redraw & (1 << i) and self._touches_dirty(s.x, s.y):
+                    redraw |= 1 << i
+                    self._mark(s.x, s.y)
+                    grown = True
+        repainted = _repaint_tiles(self)
+        for i in range(MAX_SPRITES):
+            s = sprites[i]
+            if redraw & (1 << i):
+                _blend_sprite(self, s.tile, s.x, s.y)
+            s.drawn = s.visible
+            s.drawn_x = s.x
+            s.drawn_y = s.y
+            s.changed = False
+        return repainted
+
+
+@micropython.viper
+def _repaint_tiles(tm) -> int:
+    ts = tm.tileset
+    src = ptr32(ts.data)
+    cells = ptr8(tm.cells)
+    dirty = ptr8(tm.dirty)
+    g = ptr32(_tgeom)
+    Data = ptr32(_tdata)
+    nword = g[4]
+    stride = g[2]
+    cols = int(tm.cols)
+    rows = int(tm.rows)
+    tw = int(ts.row_words)
+    th = int(ts.tile_h)
+    tile_words = int(ts.tile_words)
+    # The map is not clipped, but it is cut to the target so a map that doesn't fit
+    # never writes outside the buffer
+    height = g[1]
+    wcols = (g[0] + int(PIXELS_PER_WORD) - 1) // int(PIXELS_PER_WORD)
+    y0 = int(tm.y)
+    wx0 = int(tm.word_x)
+    repainted = 0
+    i = 0
+    for r in range(rows):
+        for c in range(cols):
+            if dirty[i]:
+                dirty[i] = 0
+                off = cells[i] * tile_words
+                yy = y0 + r * th
+                wc = wx0 + c * tw
+                for _ in range(th):
+                    if yy >= 0 and yy < height:
+                        k = yy * stride + g[3]
+                        for j in range(tw):
+                            if wc + j >= 0 and wc + j < wcols:
+                                dst = k + wc + j
+                                if dst < 0:
+                                    dst += nword  # First pixel of the screen lives in the last word
+                                Data[dst] = src[off + j]
+                    off += tw
+                    yy += 1
+                repainted += 1
+            i += 1
+    return repainted
+
+@micropython.viper
+def _blend_sprite(tm, tile: int, x: int, y: int):
+    ts = tm.tileset
+    src = ptr32(ts.data)
+    msk = ptr32(ts.mask)
+    g = ptr32(_tgeom)
+    Data = ptr32(_tdata)
+    nword = g[4]
+    tw = int(ts.row_words)
+    th = int(ts.tile_h)
+    off = tile * int(ts.tile_words)
+    # Sprites are clipped to the map area (in words / rows), cut to the target
+    col_min = int(tm.word_x)
+    col_max = col_min + int(tm.cols) * tw
+    y_min = int(tm.y)
+    y_max = y_min + int(tm.rows) * th
+    wcols = (g[0] + int(PIXELS_PER_WORD) - 1) // int(PIXELS_PER_WORD)
+    if col_min < 0:
+        col_min = 0
+    if col_max > wcols:
+        col_max = wcols
+    if y_min < 0:
+        y_min = 0
+    if y_max > g[1]:
+        y_max = g[1]
+    if x >= 0:
+        wx = x // int(PIXELS_PER_WORD)
+    else:
+        wx = 0 - (int(PIXELS_PER_WORD) - 1 - x) // int(PIXELS_PER_WORD)
+    shift = (x - wx * int(PIXELS_PER_WORD)) * int(BITS_PER_PIXEL)
+    back = int(USABLE_BITS) - shift
+    for r in range(th):
+        yy = y + r
+        if yy >= y_min and yy < y_max:
+            base = yy * g[2] + g[3]
+            for j in range(tw):
+                m = msk[off + j]
+                if m:
+                    d = src[off + j] & m
+                    c = wx + j
+                    if c >= col_min and c < col_max:
+                        k = base + c
+                        if k < 0:
+                            k += nword
+                        Data[k] = (Data[k] & (((m << shift) & 0x3FFFFFFF) ^ 0x3FFFFFFF)) | ((d << shift) & 0x3FFFFFFF)
+                    c += 1
+                    if shift and c >= col_min and c < col_max:
+                        k = base + c
+                        if k < 0:
+                            k += nword
+                        Data[k] = (Data[k] & ((m >> back) ^ 0x3FFFFFFF)) | (d >> back)
+        off += tw
+
+
+# Span-diff renderer
+# Instead of clearing a region and redrawing it, a frame is rasterized into per-scanline
+# span lists (start, end, color). present() diffs them against the spans of the previous
+# frame and only writes the pixels whose color actually changed.
+class SpanList:
+    def __init__(self, x1, y1, x2, y2, max_spans=8, background=BLACK):
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+        self.rows = y2 - y1
+        self.max_spans = max_spans
+        self.background = background
+        slots = (self.rows + 1) * max_spans  # Last row of slots is scratch space for _span_paint
+        self.count = bytearray(self.rows)
+        # Rows that needed more than max_spans spans: they are drawn straight to the target
+        # instead, and the next frame redraws them whole
+        self.overflow = bytearray(self.rows)
+        self.direct = array('l', [0])  # Words written by overflowing rows
+        self.start = array('H', bytearray(2 * slots))
+        self.end = array('H', bytearray(2 * slots))
+        self.color = array('H', bytearray(2 * slots))  # Colors may carry a pattern
+        self.painted_words = 0  # Words a direct draw of the same spans would have written
+
+    def clear(self):
+        _zero_bytes(self.count, self.rows)
+        _zero_bytes(self.overflow, self.rows)
+        self.direct[0] = 0
+        self.painted_words = 0
+
+    def fill_triangle(self, x1, y1, x2, y2, x3, y3, color):
+        # Same scanline rules as fill_triangle(), recorded as spans instead of drawn
+        if y1 > y2:
+            x1, x2 = x2, x1
+            y1, y2 = y2, y1
+        if y1 > y3:
+            x1, x3 = x3, x1
+            y1, y3 = y3, y1
+        if y2 > y3:
+            x2, x3 = x3, x2
+            y2, y3 = y3, y2
+        if y3 < self.y1 or y1 >= self.y2:
+            return
+        y_start = max(self.y1, y1)
+        y_end = min(self.y2 - 1, y3)
+        for y in range(y_start, y_end + 1):
+            if y < y2:
+                xa = x1 if y2 == y1 else x1 + (x2 - x1) * (y - y1) // (y2 - y1)
+                xb = x1 if y3 == y1 else x1 + (x3 - x1) * (y - y1) // (y3 - y1)
+            else:
+                xa = x2 if y3 == y2 else x2 + (x3 - x2) * (y - y2) // (y3 - y2)
+                xb = x1 if y3 == y1 else x1 + (x3 - x1) * (y - y1) // (y3 - y1)
+            if xa > xb:
+                xa, xb = xb, xa
+            self.painted_words += _span_paint(self, y, xa, xb, color)
+
+
+class SpanRenderer:
+    def __init__(self, x1, y1, x2, y2, background=BLACK, max_spans=8):
+        self.front = SpanList(x1, y1, x2, y2, max_spans, background)  # What is on screen now
+        self.back = SpanList(x1, y1, x2, y2, max_spans, background)   # Frame being built
+        self.background = background
+        # Bound methods are created once and swapped with the lists (creating one allocates)
+        self.fill_triangle = self.back.fill_triangle
+        self._front_fill = self.front.fill_triangle
+
+    def reset(self):
+        # Call after the region was cleared to the background by other means
+        self.front.clear()
+        self.back.clear()
+
+    def begin(self):
+        self.back.clear()
+
+    def present(self):
+        # Write the differences to the frame buffer, returns the number of words written
+        words = _span_diff(self.front, self.back, self.background) + self.back.direct[0]
+        self.front, self.back = self.back, self.front
+        self.fill_triangle, self._front_fill = self._front_fill, self.fill_triangle
+        return words
+
+
+@micropython.viper
+def _zero_bytes(buf, n: int):
+    p = ptr8(buf)
+    for i in range(n):
+        p[i] = 0
+
+
+@micropython.viper
+def _span_paint(sl, y: int, xa: int, xb: int, col: int) -> int:
+    # Paint [xa, xb) over row y's spans, keeping them sorted and non-overlapping
+    r = y - int(sl.y1)
+    if r < 0 or r >= int(sl.rows):
+        return 0
+    if xa < int(sl.x1):
+        xa = int(sl.x1)
+    if xb > int(sl.x2):
+        xb = int(sl.x2)
+    if xa >= xb:
+        return 0
+    count = ptr8(sl.count)
+    overflow = ptr8(sl.overflow)
+    start = ptr16(sl.start)
+    end = ptr16(sl.end)
+    color = ptr16(sl.color)
+    direct = ptr32(sl.direct)
+    m = int(sl.max_spans)
+    words = (xb - 1) // int(PIXELS_PER_WORD) - xa // int(PIXELS_PER_WORD) + 1
+    if overflow[r]:
+        draw_fastHline(xa, xb, y, col)
+        direct[0] += words
+        return words
+    base = r * m
+    tmp = int(sl.rows) * m
+    n = count[r]
+    out = 0
+    lost = 0
+    # Parts of older spans left of the new one
+    for i in range(n):
+        s = start[base + i]
+        if s < xa:
+            if out < m - 1:
+                e = end[base + i]
+                start[tmp + out] = s
+                end[tmp + out] = e if e < xa else xa
+                color[tmp + out] = color[base + i]
+                out += 1
+            else:
+                lost = 1
+    if out > 0 and color[tmp + out - 1] == col and end[tmp + out - 1] == xa:
+        end[tmp + out - 1] = xb  # Same color touching on the left, merge
+    else:
+        start[tmp + out] = xa
+        end[tmp + out] = xb
+        color[tmp + out] = col
+        out += 1
+    # Parts of older spans right of the new one
+    for i in range(n):
+        e = end[base + i]
+        if e > xb:
+            s = start[base + i]
+            if s <= xb and color[base + i] == col:
+                end[tmp + out - 1] = e  # Same color touching on the right, merge
+            elif out < m:
+                start[tmp + out] = s if s > xb else xb
+                end[tmp + out] = e
+                color[tmp + out] = color[base + i]
+                out += 1
+            else:
+                lost = 1
+    if lost:
+        # Too many spans: redraw the row as painted so far and draw the rest of the
+        # frame on this row directly
+        x1 = int(sl.x1)
+        x2 = int(sl.x2)
+        draw_fastHline(x1, x2, y, int(sl.background))
+        direct[0] += (x2 - 1) // int(PIXELS_PER_WORD) - x1 // int(PIXELS_PER_WORD) + 1
+        for i in range(n):
+            s = start[base + i]
+            e = end[base + i]
+            draw_fastHline(s, e, y, color[base + i])
+            direct[0] += (e - 1) // int(PIXELS_PER_WORD) - s // int(PIXELS_PER_WORD) + 1
+        draw_fastHline(xa, xb, y, col)
+        direct[0] += words
+        overflow[r] = 1
+        return words
+    for i in range(out):
+        start[base + i] = start[tmp + i]
+        end[base + i] = end[tmp + i]
+        color[base + i] = color[tmp + i]
+    count[r] = out
+    return words
+
+@micropython.viper
+def _span_diff(old, new, bg: int) -> int:
+    # Walk both span lists of every row and redraw only where the color changed
+    o_count = ptr8(old.count)
+    o_over = ptr8(old.overflow)
+    n_over = ptr8(new.overflow)
+    o_start = ptr16(old.start)
+    o_end = ptr16(old.end)
+    o_color = ptr16(old.color)
+    n_count = ptr8(new.count)
+    n_start = ptr16(new.start)
+    n_end = ptr16(new.end)
+    n_color = ptr16(new.color)
+    m = int(new.max_spans)
+    x1 = int(new.x1)
+    x2 = int(new.x2)
+    y1 = int(new.y1)
+    words = 0
+    for r in range(int(new.rows)):
+        base = r * m
+        if n_over[r]:
+            continue  # Already drawn while painting
+        on = o_count[r]
+        nn = n_count[r]
+        y = y1 + r
+        if o_over[r]:
+            # The old spans of this row are incomplete, redraw it whole
+            draw_fastHline(x1, x2, y, bg)
+            words += (x2 - 1) // int(PIXELS_PER_WORD) - x1 // int(PIXELS_PER_WORD) + 1
+            for j in range(nn):
+                s = n_start[base + j]
+                e = n_end[base + j]
+                draw_fastHline(s, e, y, n_color[base + j])
+                words += (e - 1) // int(PIXELS_PER_WORD) - s // int(PIXELS_PER_WORD) + 1
+            continue
+        if on == 0 and nn == 0:
+            continue
+        i = 0
+        j = 0
+        run_a = 0
+        run_b = 0
+        run_c = 0
+        pos = x1
+        while pos < x2:
+            while i < on and o_end[base + i] <= pos:
+                i += 1
+            if i < on and o_start[base + i] <= pos:
+                oc = o_color[base + i]
+                o_next = o_end[base + i]
+            else:
+                oc = bg
+                o_next = o_start[base + i] if i < on else x2
+            while j < nn and n_end[base + j] <= pos:
+                j += 1
+            if j < nn and n_start[base + j] <= pos:
+                nc = n_color[base + j]
+                n_next = n_end[base + j]
+            else:
+                nc = bg
+                n_next = n_start[base + j] if j < nn else x2
+            nxt = o_next if o_next < n_next else n_next
+            if oc != nc:
+                if run_b == pos and run_c == nc:
+                    run_b = nxt  # Extend the pending run
+                else:
+                    if run_b > run_a:
+                        draw_fastHline(run_a, run_b, y, run_c)
+                        words += (run_b - 1) // int(PIXELS_PER_WORD) - run_a // int(PIXELS_PER_WORD) + 1
+                    run_a = pos
+                    run_b = nxt
+                    run_c = nc
+            pos = nxt
+        if run_b > run_a:
+            draw_fastHline(run_a, run_b, y, run_c)
+            words += (run_b - 1) // int(PIXELS_PER_WORD) - run_a // int(PIXELS_PER_WORD) + 1
+    return words
+
+
 # 3D Cube
+# Fixed point so a frame doesn't allocate (floats are heap objects on the Pico):
+# angles are in 1/65536 of a turn and sines are scaled by 2**14.
+ANGLE_UNITS = const(65536)
+FIX_SHIFT = const(14)
+SIN_TABLE = None  # 1024 entries, built by the first Cube3D() rather than at import
+
+def _build_sin_table():
+    global SIN_TABLE
+    if SIN_TABLE is None:
+        SIN_TABLE = array('h', range(1024))
+        for i in range(1024):
+            SIN_TABLE[i] = int(sin(2 * pi * i / 1024) * (1 << FIX_SHIFT))
+
+def shade_dither(color, level):
+    # Cube3D.shade hook: dither the face color with black by brightness, keeping a
+    # quarter of it as ambient light
+    return dither(color, BLACK, 4 + level * 3 // 4)
+
 class Cube3D:
     def __init__(self):
-        self.vertices = [
-            [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
-            [-1, -1, 1],  [1, -1, 1],  [1, 1, 1],  [-1, 1, 1]
-        ]
-        self.faces = [
-            ([0, 1, 2, 3], RED), ([4, 5, 6, 7], GREEN), ([0, 1, 5, 4], BLUE),
-            ([2, 3, 7, 6], YELLOW), ([0, 3, 7, 4], MAGENTA), ([1, 2, 6, 5], CYAN)
-        ]
-        self.edges = [
-            (0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7), (7, 4),
-            (0, 4), (1, 5), (2, 6), (3, 7)
-        ]
+        _build_sin_table()
+        self.vertices = array('b', [
+            -1, -1, -1,  1, -1, -1,  1, 1, -1,  -1, 1, -1,
+            -1, -1, 1,   1, -1, 1,   1, 1, 1,   -1, 1, 1
+        ])
+        self.faces = array('B', [0, 1, 2, 3,  4, 5, 6, 7,  0, 1, 5, 4,  2, 3, 7, 6,  0, 3, 7, 4,  1, 2, 6, 5])
+        self.colors = bytearray([RED, GREEN, BLUE, YELLOW, MAGENTA, CYAN])
+        self.edges = array('B', [0, 1, 1, 2, 2, 3, 3, 0, 4, 5, 5, 6, 6, 7, 7, 4, 0, 4, 1, 5, 2, 6, 3, 7])
+        self.shade = None  # Lighting hook: shade(color, brightness 0-16) -> fill color
         self.angle_x = 0
         self.angle_y = 0
         self.angle_z = 0
+        self.spin_x = 0
+        self.spin_y = 0
+        self.spin_z = 0
+        # Scratch storage reused by every draw()
+        self.matrix = array('l', bytearray(4 * 9))
+        self.points = array('h', bytearray(2 * 16))  # Projected x, y per vertex
+        self.z = array('l', bytearray(4 * 8))  # Rotated z per vertex
+        self.depth = array('l', bytearray(4 * 6))
+        self.order = bytearray(6)
     
     def rotate(self, dx, dy, dz):
-        self.angle_x += dx
-        self.angle_y += dy
-        self.angle_z += dz
-    
-    def draw(self, filled=True):
-        rx = Matrix3D.rotate_x(self.angle_x)
-        ry = Matrix3D.rotate_y(self.angle_y)
-        rz = Matrix3D.rotate_z(self.angle_z)
-        rotation = Matrix3D.multiply(Matrix3D.multiply(rx, ry), rz)
-        transformed = [Matrix3D.transform(rotation, v) for v in self.vertices]
-        
-        if filled:
-            face_depths = []
-            for face_indices, color in self.faces:
-                avg_z = sum(transformed[i][2] for i in face_indices) / len(face_indices)
-                face_depths.append((avg_z, face_indices, color))
-            face_depths.sort(key=lambda x: x[0])
-            for _, face_indices, color in face_depths:
-                projected = [project_3d(*transformed[i]) for i in face_indices]
-                if len(projected) == 4:
-                    p0, p1, p2, p3 = projected
-                    fill_triangle(p0[0], p0[1], p1[0], p1[1], p2[0], p2[1], color)
-                    fill_triangle(p0[0], p0[1], p2[0], p2[1], p3[0], p3[1], color)
-        else:
-            projected = [project_3d(*v) for v in transformed]
-            for edge in self.edges:
-                p1, p2 = projected[edge[0]], projected[edge[1]]
-                draw_line(p1[0], p1[1], p2[0], p2[1], WHITE)
-
-
-
-# Terminal settings
-TERM_X, TERM_Y = 440, 10
-TERM_WIDTH, TERM_HEIGHT = 190, 460
-TERM_MAX_LINES = 28
-
-text_buffer = []
-command_history = []
-current_mode = "demo"
-previous_mode = "demo"
-cube = Cube3D()
-mode_changed = False
-show_terminal = True
-
-def add_to_terminal(message, color=WHITE):
-    global command_history
-    command_history.append((message, color))
-    if len(command_history) > TERM_MAX_LINES:
-        command_history.pop(0)
-
-def draw_terminal():
-    if not show_terminal:
-        return
-    fill_rect(TERM_X - 5, TERM_Y - 5, H_res - 5, V_res - 5, BLACK)
-    draw_rect(TERM_X - 5, TERM_Y - 5, H_res - 5, V_res - 5, WHITE)
-    draw_text(TERM_X, TERM_Y, "Terminal", GREEN, 1)
-    draw_text(TERM_X, TERM_Y + 12, "GP16-GP21", CYAN, 1)
-    y_pos = TERM_Y + 30
-    for message, color in command_history:
-        if y_pos > TERM_Y + TERM_HEIGHT - 20:
-            break
-        msg = message[:28] if len(message) > 28 else message
-        draw_text(TERM_X, y_pos, msg, color, 1)
-        y_pos += 15
-
-
-
-# Write command processor
-def process_command(cmd):
-    global current_mode, text_buffer, mode_changed, previous_mode, show_terminal
-    original_cmd = cmd.strip()
-    cmd_upper = cmd.strip().upper()
-    
-    # for GPIO
-    if cmd_upper.startswith("GPIO ") or cmd_upper.startswith("GP"):
-        parts = cmd_upper.replace("GPIO", "GP").split()
-        if len(parts) >= 2:
-            try:
-                pin_str = parts[0].replace("GP", "")
-                if not pin_str and len(parts) >= 3:
-                    pin_str = parts[1]
-                    state_str = parts[2] if len(parts) > 2 else ""
-                else:
-                    state_str = parts[1] if len(parts) > 1 else ""
-                pin_num = int(pin_str)
-                
-                if state_str in ["ON", "1", "HIGH"]:
-                    success, msg = gpio_control(pin_num, True)
-                    if current_mode == "text":
-                        add_to_terminal(f"> {original_cmd}", CYAN)
-                        add_to_terminal(msg, GREEN if success else RED)
-                    return msg
-                elif state_str in ["OFF", "0", "LOW"]:
-                    success, msg = gpio_control(pin_num, False)
-                    if current_mode == "text":
-                        add_to_terminal(f"> {original_cmd}", CYAN)
-                        add_to_terminal(msg, YELLOW if success else RED)
-                    return msg
-                else:
-                    msg = "Use: GPIO 16 ON/OFF"
-                    if current_mode == "text":
-                        add_to_terminal(f"> {original_cmd}", CYAN)
-                        add_to_terminal(msg, RED)
-                    return msg
-            except (ValueError, IndexError):
-                msg = "Invalid GPIO command"
-                if current_mode == "text":
-                    add_to_terminal(f"> {original_cmd}", CYAN)
-                    add_to_terminal(msg, RED)
-                return msg
-    
-    # For color
-    elif cmd_upper == "BLUE":
-        previous_mode = current_mode
-        current_mode = "static"
-        mode_changed = True
-        fill_screen(BLUE)
-        draw_text(10, 10, "BLUE MODE", WHITE, 2)
-        draw_text(10, 40, "Type DEMO to return", CYAN, 1)
-        return "Switched to BLUE"
-    
-    elif cmd_upper == "RED":
-        previous_mode = current_mode
-        current_mode = "static"
-        mode_changed = True
-        fill_screen(RED)
-        draw_text(10, 10, "RED MODE", WHITE, 2)
-        draw_text(10, 40, "Type DEMO to return", CYAN, 1)
-        return "Switched to RED"
-    
-    elif cmd_upper == "GREEN":
-        previous_mode = current_mode
-        current_mode = "static"
-        mode_changed = True
-        fill_screen(GREEN)
-        draw_text(10, 10, "GREEN MODE", WHITE, 2)
-        draw_text(10, 40, "Type DEMO to return", CYAN, 1)
-        return "Switched to GREEN"
-    
-    elif cmd_upper == "MULTICOLOUR" or cmd_upper == "MULTICOLOR":
-        previous_mode = current_mode
-        current_mode = "static"
-        mode_changed = True
-        for h in range(8):
-            for i in range(60):
-                for k in range(8):
-                    draw_fastHline(k * 80, k * 80 + 80, h * 60 + i, (h + k) % 8)
-        draw_text(10, 10, "MULTICOLOUR", BLACK, 2)
-        draw_text(10, 40, "Type DEMO to return", WHITE, 1)
-        return "Switched to MULTICOLOUR"
+        # Angles in radians
+        self.angle_x = (self.angle_x + int(dx * ANGLE_UNITS / (2 * pi))) % ANGLE_UNITS
+        self.angle_y = (self.angle_y + int(dy * ANGLE_UNITS / (2 * pi))) % ANGLE_UNITS
+        self.angle_z = (self.angle_z + int(dz * ANGLE_UNITS / (2 * pi))) % ANGLE_UNITS
     
-    # For Mode selection
-    elif cmd_upper == "DEMO":
-        previous_mode = current_mode
-        current_mode = "demo"
-        mode_changed = True
-        fill_screen(BLACK)
-        return "Starting 3D cube demo"
+    def set_spin(self, dx, dy, dz):
+        # Rotation applied by each step(), in radians per frame (converted once)
+        self.spin_x = int(dx * ANGLE_UNITS / (2 * pi))
+        self.spin_y = int(dy * ANGLE_UNITS / (2 * pi))
+        self.spin_z = int(dz * ANGLE_UNITS / (2 * pi))
     
-    elif cmd_upper == "TEXT":
-        previous_mode = current_mode
-        current_mode = "text"
-        mode_changed = True
-        command_history.clear()
-        text_buffer = []
-        fill_screen(BLACK)
-        add_to_terminal("TEXT MODE", GREEN)
-        add_to_terminal("Type anything", CYAN)
-        add_to_terminal("GPIO commands work", CYAN)
-        return "TEXT mode"
+    def step(self):
+        self.angle_x = (self.angle_x + self.spin_x) % ANGLE_UNITS
+        self.angle_y = (self.angle_y + self.spin_y) % ANGLE_UNITS
+        self.angle_z = (self.angle_z + self.spin_z) % ANGLE_UNITS
     
-    # for healper commands
-    elif cmd_upper == "CLEAR":
-        if current_mode == "text":
-            command_history.clear()
-            text_buffer = []
-            add_to_terminal("Terminal cleared", GREEN)
-        return "Terminal cleared"
+    def _update(self):
+        # Rotation matrix Rx * Ry * Rz and the projected vertices
+        sx = SIN_TABLE[(self.angle_x >> 6) & 1023]
+        cx = SIN_TABLE[((self.angle_x >> 6) + 256) & 1023]
+        sy = SIN_TABLE[(self.angle_y >> 6) & 1023]
+        cy = SIN_TABLE[((self.angle_y >> 6) + 256) & 1023]
+        sz = SIN_TABLE[(self.angle_z >> 6) & 1023]
+        cz = SIN_TABLE[((self.angle_z >> 6) + 256) & 1023]
+        a10 = (sx * sy) >> FIX_SHIFT
+        a12 = -(sx * cy) >> FIX_SHIFT
+        a20 = -(cx * sy) >> FIX_SHIFT
+        a22 = (cx * cy) >> FIX_SHIFT
+        m = self.matrix
+        m[0] = (cy * cz) >> FIX_SHIFT
+        m[1] = -(cy * sz) >> FIX_SHIFT
+        m[2] = sy
+        m[3] = (a10 * cz + cx * sz) >> FIX_SHIFT
+        m[4] = (cx * cz - a10 * sz) >> FIX_SHIFT
+        m[5] = a12
+        m[6] = (a20 * cz + sx * sz) >> FIX_SHIFT
+        m[7] = (sx * cz - a20 * sz) >> FIX_SHIFT
+        m[8] = a22
+        v = self.vertices
+        p = self.points
+        for i in range(8):
+            vx, vy, vz = v[3 * i], v[3 * i + 1], v[3 * i + 2]
+            x = m[0] * vx + m[1] * vy + m[2] * vz
+            y = m[3] * vx + m[4] * vy + m[5] * vz
+            z = m[6] * vx + m[7] * vy + m[8] * vz
+            # project_3d() with distance 4: 80 * 4 / (4 + z)
+            d = (4 << FIX_SHIFT) + z
+            p[2 * i] = H_res // 2 + 320 * x // d
+            p[2 * i + 1] = V_res // 2 - 320 * y // d
+            self.z[i] = z
     
-    elif cmd_upper == "HELP":
-        if current_mode == "text":
-            add_to_terminal(f"> {original_cmd}", CYAN)
-            add_to_terminal("Commands:", WHITE)
-            add_to_terminal("GPIO <16-21> ON/OFF", GREEN)
-            add_to_terminal("DEMO, BLUE, RED", GREEN)
-            add_to_terminal("GREEN, MULTICOLOUR", GREEN)
-            add_to_terminal("CLEAR, STATUS, HELP", GREEN)
+    def draw(self, filled=True, fill=fill_triangle):
+        self._update()
+        p = self.points
+        if filled:
+            f = self.faces
+            depth = self.depth
+            order = self.order
+            vz = self.z
+            for i in range(6):
+                # Sum of the face's z (sorting doesn't need the average)
+                z = vz[f[4 * i]] + vz[f[4 * i + 1]] + vz[f[4 * i + 2]] + vz[f[4 * i + 3]]
+                depth[i] = z
+                # Insertion sort by descending depth: larger z is farther from the
+                # camera, so far faces are drawn first and the near ones cover them
+                j = i
+                while j > 0 and depth[order[j - 1]] < z:
+                    order[j] = order[j - 1]
+                    j -= 1
+                order[j] = i
+            for i in range(6):
+                face = order[i]
+                color = self.colors[face]
+                if self.shade:
+                    # A face's center is its unit normal, so its z (depth / 4, scaled
+                    # by 2**14) says how squarely it faces the camera looking down +z
+                    level = -depth[face] >> (FIX_SHIFT - 2)
+                    color = self.shade(color, 0 if level < 0 else 16 if level > 16 else level)
+                k0 = 2 * f[4 * face]
+                k1 = 2 * f[4 * face + 1]
+                k2 = 2 * f[4 * face + 2]
+                k3 = 2 * f[4 * face + 3]
+                fill(p[k0], p[k0 + 1], p[k1], p[k1 + 1], p[k2], p[k2 + 1], color)
+                fill(p[k0], p[k0 + 1], p[k2], p[k2 + 1], p[k3], p[k3 + 1], color)
         else:
-            previous_mode = current_mode
-            current_mode = "static"
-            mode_changed = True
-            fill_screen(BLACK)
-            draw_text(10, 10, "Commands:", WHITE, 2)
-            draw_text(10, 40, "BLUE, RED, GREEN", CYAN, 1)
-            draw_text(10, 55, "MULTICOLOUR", CYAN, 1)
-            draw_text(10, 70, "DEMO - 3D cube", CYAN, 1)
-            draw_text(10, 85, "TEXT - cmd prompt", CYAN, 1)
-            draw_text(10, 100, "GPIO <16-21> ON/OFF", CYAN, 1)
-            draw_text(10, 115, "STATUS, CLEAR, HELP", CYAN, 1)
-        return "Help displayed"
-    
-    elif cmd_upper == "STATUS":
-        if current_mode == "text":
-            add_to_terminal(f"> {original_cmd}", CYAN)
-            add_to_terminal("GPIO Status:", WHITE)
-            for pin in sorted(AVAILABLE_GPIOS):
-                if pin in gpio_pins:
-                    state = "ON" if gpio_pins[pin].value() else "OFF"
-                    color = GREEN if gpio_pins[pin].value() else YELLOW
-                    add_to_terminal(f"GP{pin}: {state}", color)
-                else:
-                    add_to_terminal(f"GP{pin}: INIT", WHITE)
-        return "Status displayed"
-    
-    else:
-        if current_mode == "text" and original_cmd:
-            add_to_terminal(f"> {original_cmd}", WHITE)
-        return None
-
-def read_serial_input():
-    if select.select([sys.stdin], [], [], 0)[0]:
-        return sys.stdin.readline().strip()
-    return None
-
-# loop main program
-def main_loop():
-    global current_mode, text_buffer, mode_changed
-    print("VGA Ready | GPIO: 16-21 | Type HELP")
-    fill_screen(BLACK)
-    
-    while True:
-        user_input = read_serial_input()
-        if user_input:
-            result = process_command(user_input)
-            if result:
-                print(result)
-        
-        if current_mode == "demo":
-            t = ticks_ms()
-            if mode_changed:
-                fill_screen(BLACK)
-                mode_changed = False
-            else:
-                clear_region(80, 60, 560, 420, BLACK)
-            cube.rotate(0.05, 0.07, 0.03)
-            cube.draw(filled=True)
-            elapsed = ticks_diff(ticks_ms(), t)
-            if elapsed < 33:
-                sleep_ms(33 - elapsed)
-        
-        elif current_mode == "text":
-            if mode_changed:
-                fill_screen(BLACK)
-                mode_changed = False
-            draw_terminal()
-            sleep_ms(50)
-        
-        elif current_mode == "static":
-            sleep_ms(100)
-
-# Run n Run
-configure_DMAs(len(H_buffer_line), H_buffer_line_address)
-startsync()
-fill_screen(BLACK)
-main_loop()
\ No newline at end of file
+            e = self.edges
+            for i in range(0, 24, 2):
+                k1, k2 = 2 * e[i], 2 * e[i + 1]
+                draw_line(p[k1], p[k1 + 1], p[k2], p[k2 + 1], WHITE)
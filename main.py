@@ -0,0 +1,888 @@
+# Demo application: 3D cube, text terminal and GPIO control over the serial port.
+# Upload it with VGA.py; MicroPython runs main.py at boot.
+import sys
+import select
+from array import array
+from machine import Pin
+from micropython import const
+from gc import mem_free, collect
+from time import ticks_ms, ticks_us, ticks_diff, sleep_ms
+
+# Cost of importing the library (it only defines things, the display starts in init())
+collect()
+boot_mem = mem_free()
+boot_us = ticks_us()
+import VGA
+from VGA import (
+    init, H_res, V_res, PIXELS_PER_WORD, BLACK, WHITE, RED, GREEN, BLUE, YELLOW, CYAN, ROP_XOR,
+    Surface, blit, push_clip, pop_clip, dither, shade_dither,
+    fill_screen, clear_region, draw_fastHline, draw_rect, fill_rect, fill_triangle,
+    draw_circle, draw_arc, fill_disk, fill_ellipse, fill_round_rect, shape_stats,
+    draw_text, glyph_cache, TileSet, TileMap, SpanRenderer, Cube3D,
+)
+import_us = ticks_diff(ticks_us(), boot_us)
+import_kb = (boot_mem - mem_free()) / 1024
+
+# external control (GP16-GP21)
+AVAILABLE_GPIOS = {16, 17, 18, 19, 20, 21} 
+gpio_pins = {} 
+
+def init_gpio(pin_num):
+    if pin_num in AVAILABLE_GPIOS and pin_num not in gpio_pins:
+        gpio_pins[pin_num] = Pin(pin_num, Pin.OUT)
+        gpio_pins[pin_num].off()
+        return True
+    return False
+
+def gpio_control(pin_num, state):
+    if pin_num not in AVAILABLE_GPIOS:
+        return False, f"GP{pin_num} not available"
+    if pin_num not in gpio_pins:
+        init_gpio(pin_num)
+    gpio_pins[pin_num].value(state)
+    return True, f"GP{pin_num} {'ON' if state else 'OFF'}"
+
+# Bulk GPIO through the RP2040 SIO registers. Bit 0 of a bulk mask is GP16; one
+# write to GPIO_OUT_XOR flips exactly the pins that differ, so they switch together.
+SIO_BASE = 0xD0000000
+GPIO_OUT = const(0x010)
+GPIO_OUT_XOR = const(0x01C)
+TIMERAWL = 0x40054028  # Free running microsecond timer, low word
+GPIO_FIRST = min(AVAILABLE_GPIOS)
+GPIO_BULK_MASK = sum(1 << (pin - GPIO_FIRST) for pin in AVAILABLE_GPIOS)
+GPIO_PULSE_MAX = const(1000)  # Pulses per GPIO PULSE
+GPIO_PLAY_MAX_US = const(1_000_000)  # gpio_play blocks the display and serial, keep it short
+
+gpio_regs = SIO_BASE  # Register block and timer: addresses, or a SioModel (sio_model.py) on a PC
+gpio_timer = TIMERAWL
+
+@micropython.viper
+def _sio_write(regs, mask: int, value: int):
+    r = ptr32(regs)
+    r[GPIO_OUT_XOR >> 2] = (r[GPIO_OUT >> 2] ^ value) & mask
+
+@micropython.viper
+def _sio_play(regs, timer, seq, mask: int):
+    # seq holds (value, microseconds to hold it) pairs; deadlines are absolute, so
+    # the time spent writing never accumulates into drift
+    r = ptr32(regs)
+    t = ptr32(timer)
+    s = ptr32(seq)
+    n = int(len(seq))
+    start = t[0]
+    due = 0
+    i = 0
+    while i < n:
+        r[GPIO_OUT_XOR >> 2] = (r[GPIO_OUT >> 2] ^ s[i]) & mask
+        due += s[i + 1]
+        while t[0] - start < due:
+            pass
+        i += 2
+
+def _gpio_bulk_pins(mask):
+    if mask & ~GPIO_BULK_MASK or not mask:
+        return False
+    for pin in AVAILABLE_GPIOS:
+        if mask >> (pin - GPIO_FIRST) & 1:
+            init_gpio(pin)
+    return True
+
+def gpio_write(mask, value):
+    # Set every pin in mask (bit 0 = GP16) to its bit in value with a single register write
+    if not _gpio_bulk_pins(mask):
+        return False, f"Mask {mask:#x} outside GP16-21"
+    _sio_write(gpio_regs, mask << GPIO_FIRST, value << GPIO_FIRST)
+    return True, f"GPIO {mask:#04x} = {value & mask:#04x}"
+
+def gpio_sequence(steps):
+    # Precompute [(value, microseconds), ...] into the flat array gpio_play walks
+    seq = array('L', range(2 * len(steps)))
+    total = 0
+    for i, (value, us) in enumerate(steps):
+        total += us
+        if us < 0 or total > GPIO_PLAY_MAX_US:
+            raise ValueError("Step times must be >= 0 and add up to at most 1 s")
+        seq[2 * i] = (value & GPIO_BULK_MASK) << GPIO_FIRST
+        seq[2 * i + 1] = us
+    return seq
+
+def gpio_play(seq, mask):
+    # Blocks for the length of the sequence; pins outside mask are left alone
+    if not _gpio_bulk_pins(mask):
+        return False, f"Mask {mask:#x} outside GP16-21"
+    _sio_play(gpio_regs, gpio_timer, seq, mask << GPIO_FIRST)
+    return True, f"Played {len(seq) // 2} steps on {mask:#04x}"
+
+def _pulses_ok(width_us, count):
+    return width_us > 0 and 0 < count <= GPIO_PULSE_MAX and 2 * width_us * count <= GPIO_PLAY_MAX_US
+
+def gpio_pulses(mask, width_us, count):
+    # count high pulses of width_us on every pin in mask, equal low time between them
+    if not _pulses_ok(width_us, count):
+        raise ValueError("Pulse width and count out of range")
+    seq = array('L', range(4 * count))
+    high = (mask & GPIO_BULK_MASK) << GPIO_FIRST
+    for i in range(0, 4 * count, 4):
+        seq[i] = high
+        seq[i + 1] = width_us
+        seq[i + 2] = 0
+        seq[i + 3] = width_us
+    return seq
+
+
+# Benchmarks (run with the BENCH <name> serial command)
+def bench_tiles(frames=100):
+    # Moving sprite over a full screen checkerboard: tile engine vs redrawing with fill_rect/draw_text
+    tile_w, tile_h = 20, 16
+    cols, rows = H_res // tile_w, V_res // tile_h
+    ts = TileSet(tile_w, tile_h, 7)
+    ts.set_tile(0, [[BLUE] * tile_w] * tile_h)
+    ts.set_tile(1, [[CYAN] * tile_w] * tile_h)
+    ts.set_tile(2, [[YELLOW if 2 <= i < tile_w - 2 and 2 <= r < tile_h - 2 else BLACK
+                     for i in range(tile_w)] for r in range(tile_h)])
+    tm = TileMap(ts, cols, rows)
+    for r in range(rows):
+        for c in range(cols):
+            tm.set_tile(c, r, (r + c) & 1)
+    # Title pre-rendered once into tiles 3..6
+    tm.render()
+    draw_text(4, 4, "TILE BENCH", WHITE)
+    for i in range(4):
+        ts.grab(3 + i, i * tile_w, 0)
+        tm.set_tile(i, 0, 3 + i)
+
+    def sprite_pos(f):
+        return (f * 3) % (H_res - tile_w), 100 + (f * 2) % 200
+
+    def generic_frame(f):
+        for r in range(rows):
+            for c in range(cols):
+                x, y = c * tile_w, r * tile_h
+                fill_rect(x, y, x + tile_w, y + tile_h, CYAN if (r + c) & 1 else BLUE)
+        draw_text(4, 4, "TILE BENCH", WHITE)
+        x, y = sprite_pos(f)
+        fill_rect(x + 2, y + 2, x + tile_w - 2, y + tile_h - 2, YELLOW)
+
+    t = ticks_us()
+    for f in range(frames):
+        generic_frame(f)
+    generic_us = ticks_diff(ticks_us(), t)
+
+    tm.invalidate()
+    tm.render()
+    repainted = 0
+    t = ticks_us()
+    for f in range(frames):
+        x, y = sprite_pos(f)
+        tm.set_sprite(0, x, y, 2)
+        repainted += tm.render()
+    tile_us = ticks_diff(ticks_us(), t)
+
+    print("--- Tile engine benchmark ---")
+    print(f"fill_rect/draw_text: {generic_us / frames / 1000:.2f} ms/frame, {cols * rows} tiles/frame")
+    print(f"TileMap.render:      {tile_us / frames / 1000:.2f} ms/frame, {repainted / frames:.1f} tiles/frame")
+    print(f"Speedup: {generic_us / max(tile_us, 1):.1f}x")
+
+
+def bench_rop(frames=50):
+    # Selection box moving over the cube: XOR erase + redraw vs region clear + full redraw
+    def box(f):
+        x, y = 100 + (f * 7) % 300, 80 + (f * 5) % 250
+        return x, y, x + 120, y + 80
+
+    fill_screen(BLACK)
+    t = ticks_us()
+    for f in range(frames):
+        clear_region(80, 60, 560, 420, BLACK)
+        cube.draw(filled=True)
+        x1, y1, x2, y2 = box(f)
+        draw_rect(x1, y1, x2, y2, WHITE)
+    redraw_us = ticks_diff(ticks_us(), t)
+
+    fill_screen(BLACK)
+    cube.draw(filled=True)
+    x1, y1, x2, y2 = box(0)
+    draw_rect(x1, y1, x2, y2, WHITE | ROP_XOR)
+    t = ticks_us()
+    for f in range(1, frames + 1):
+        draw_rect(x1, y1, x2, y2, WHITE | ROP_XOR)  # Erase: XOR twice restores the scene
+        x1, y1, x2, y2 = box(f)
+        draw_rect(x1, y1, x2, y2, WHITE | ROP_XOR)
+    xor_us = ticks_diff(ticks_us(), t)
+
+    print("--- Raster op benchmark ---")
+    print(f"Clear + redraw: {redraw_us / frames / 1000:.2f} ms/frame")
+    print(f"XOR box:        {xor_us / frames / 1000:.2f} ms/frame")
+    print(f"Speedup: {redraw_us / max(xor_us, 1):.1f}x")
+
+
+def bench_spans(frames=60):
+    # Rotating cube: clear-and-redraw vs span-diff rendering
+    demo = Cube3D()
+    demo.set_spin(0.05, 0.07, 0.03)
+    fill_screen(BLACK)
+    t = ticks_us()
+    for _ in range(frames):
+        clear_region(80, 60, 560, 420, BLACK)
+        demo.step()
+        demo.draw(filled=True)
+    redraw_us = ticks_diff(ticks_us(), t)
+
+    demo = Cube3D()
+    demo.set_spin(0.05, 0.07, 0.03)
+    spans = SpanRenderer(80, 60, 560, 420)
+    fill_screen(BLACK)
+    # clear_region(80, 60, 560, 420), counted like _span_paint counts a span
+    clear_words = (420 - 60) * ((560 - 1) // PIXELS_PER_WORD - 80 // PIXELS_PER_WORD + 1)
+    painted = 0
+    written = 0
+    t = ticks_us()
+    for _ in range(frames):
+        spans.begin()
+        demo.step()
+        demo.draw(filled=True, fill=spans.fill_triangle)
+        painted += spans.back.painted_words
+        written += spans.present()
+    spans_us = ticks_diff(ticks_us(), t)
+
+    print("--- Span-diff benchmark ---")
+    print(f"Clear + redraw: {clear_words + painted / frames:.0f} words/frame, {frames * 1000000 / redraw_us:.1f} FPS")
+    print(f"Span diff:      {written / frames:.0f} words/frame, {frames * 1000000 / spans_us:.1f} FPS")
+
+
+def bench_text(lines=20):
+    # Status board text at scales 1-4: cold vs warm glyph cache
+    line = "TEMP 23.5C  FAN OK"
+    print("--- Text benchmark ---")
+    for scale in range(1, 5):
+        glyph_cache.clear()
+        fill_screen(BLACK)
+        rows = min(lines, V_res // (10 * scale))
+        t = ticks_us()
+        for i in range(rows):
+            draw_text(5, i * 10 * scale, line, WHITE, scale)
+        cold_us = ticks_diff(ticks_us(), t)
+        t = ticks_us()
+        for i in range(rows):
+            draw_text(5, i * 10 * scale, line, GREEN, scale)
+            draw_text(5, i * 10 * scale, line, WHITE, scale)
+        warm_us = ticks_diff(ticks_us(), t) // 2  # Same glyphs, color applied at blit
+        chars = rows * len(line)
+        print(f"Scale {scale}: cold {chars * 1000000 // max(cold_us, 1)} chars/s, "
+              f"warm {chars * 1000000 // max(warm_us, 1)} chars/s, "
+              f"hit rate {glyph_cache.hit_rate() * 100:.0f}%, cache {glyph_cache.size} bytes")
+
+
+def _legacy_circle_counts(r, x=320):
+    # Spans and words the previous fill_disk/draw_circle wrote for a fully visible circle
+    spans = words = pixels = 0
+    x_pos, y_pos, err = -r, 0, 2 - 2 * r
+    while 1:
+        x1, x2 = x + x_pos, x - x_pos  # fill_disk's spans stopped short of x + r
+        for _ in range(2):
+            spans += 1
+            words += x2 - x1 if x2 // 10 == x1 // 10 else x2 // 10 - x1 // 10 + 1
+        pixels += 4
+        e2 = err
+        if e2 <= y_pos:
+            y_pos += 1
+            err += y_pos * 2 + 1
+            if -x_pos == y_pos and e2 <= x_pos:
+                e2 = 0
+        if e2 > x_pos:
+            x_pos += 1
+            err += x_pos * 2 + 1
+        if x_pos > 0:
+            break
+    return spans, words, pixels
+
+
+def bench_shapes(reps=10):
+    # Per-scanline circle rasterizer vs the previous midpoint loop, plus clipped and elliptic shapes
+    print("--- Shape benchmark ---")
+    print("shape       spans old/new   words old/new   ms/shape")
+    for r in (10, 50, 100, 200):
+        old_spans, old_words, old_pixels = _legacy_circle_counts(r)
+        fill_screen(BLACK)
+        shape_stats[0] = shape_stats[1] = 0
+        t = ticks_us()
+        for _ in range(reps):
+            fill_disk(320, 240, r, WHITE)
+        us = ticks_diff(ticks_us(), t)
+        print(f"disk r={r:<4} {old_spans:5} /{shape_stats[0] // reps:5}  {old_words:6} /{shape_stats[1] // reps:6}  {us / reps / 1000:8.2f}")
+        shape_stats[0] = shape_stats[1] = 0
+        t = ticks_us()
+        for _ in range(reps):
+            draw_circle(320, 240, r, WHITE)
+        us = ticks_diff(ticks_us(), t)
+        print(f"ring r={r:<4} {old_pixels:5} /{shape_stats[0] // reps:5}  {old_pixels:6} /{shape_stats[1] // reps:6}  {us / reps / 1000:8.2f}")
+    for name, draw in (("ellipse", lambda: fill_ellipse(320, 240, 200, 80, WHITE)),
+                       ("rrect", lambda: fill_round_rect(120, 140, 520, 340, 24, WHITE)),
+                       ("clipped", lambda: fill_disk(-150, 240, 200, WHITE)),
+                       ("arc 90", lambda: draw_arc(320, 240, 200, 0, 90, WHITE)),
+                       ("arc 270", lambda: draw_arc(320, 240, 200, 45, 315, WHITE))):
+        fill_screen(BLACK)
+        shape_stats[0] = shape_stats[1] = 0
+        t = ticks_us()
+        for _ in range(reps):
+            draw()
+        us = ticks_diff(ticks_us(), t)
+        print(f"{name:<11}     - /{shape_stats[0] // reps:5}       - /{shape_stats[1] // reps:6}  {us / reps / 1000:8.2f}")
+    print("(old ring = one draw_pix per point, i.e. one word per pixel; the old code skipped off-screen centers)")
+
+
+def bench_gpio(reps=100):
+    # Updating GP16-GP21: six Pin writes (and six parsed commands) vs one SIO register write
+    pins = sorted(AVAILABLE_GPIOS)
+    for pin in pins:
+        init_gpio(pin)
+    print("--- GPIO benchmark ---")
+
+    def timed(label, fn):
+        t = ticks_us()
+        for i in range(reps):
+            fn(i & 1)
+        us = ticks_diff(ticks_us(), t) / reps
+        print(f"{label:<26} {us:8.1f} us")
+        return us
+
+    def per_pin(state):
+        for pin in pins:
+            gpio_control(pin, state)
+
+    def per_pin_cmd(state):
+        for pin in pins:
+            process_command(f"GPIO {pin} {'ON' if state else 'OFF'}")
+
+    per_pin_us = timed("gpio_control x6", per_pin)
+    timed("GPIO <n> ON/OFF x6", per_pin_cmd)
+    timed("gpio_write", lambda state: gpio_write(0x3F, 0x15 if state else 0x2A))
+    timed("GPIO MASK 0x3F VALUE ..", lambda state: process_command("GPIO MASK 0x3F VALUE " + ("0x15" if state else "0x2A")))
+    bulk = GPIO_BULK_MASK << GPIO_FIRST
+    timed("_sio_write (raw)", lambda state: _sio_write(gpio_regs, bulk, bulk if state else 0))
+    print(f"Skew GP16->GP21: ~{per_pin_us * 5 / 6:.1f} us per-pin, 0 us bulk (one write)")
+
+    seq = gpio_pulses(0x01, 50, 100)  # 100 pulses of 50 us on GP16
+    t = ticks_us()
+    gpio_play(seq, 0x01)
+    us = ticks_diff(ticks_us(), t)
+    print(f"Pulse train: {us} us for {len(seq) // 2 * 50} us scheduled")
+    gpio_write(0x3F, 0)
+
+
+def bench_blit(reps=20):
+    # Static overlays: drawing the help text each time vs blitting the pre-rendered surface
+    panel = Surface(200, 160)
+    t = ticks_us()
+    for _ in range(reps):
+        with panel:
+            fill_screen(BLACK)
+            draw_text(0, 0, "Commands:", WHITE, 2)
+            for i in range(9):
+                draw_text(0, 30 + 15 * i, "SPANS ON/OFF - diff render", CYAN, 1)
+    draw_us = ticks_diff(ticks_us(), t) / reps
+    t = ticks_us()
+    for _ in range(reps):
+        blit(panel, VGA.screen, 10, 10)
+    aligned_us = ticks_diff(ticks_us(), t) / reps
+    t = ticks_us()
+    for _ in range(reps):
+        blit(panel, VGA.screen, 13, 10)
+    shifted_us = ticks_diff(ticks_us(), t) / reps
+    print("--- Blit benchmark ---")
+    print(f"Help panel {panel.width}x{panel.height} ({len(panel.data)} words)")
+    print(f"Draw text:      {draw_us / 1000:.2f} ms")
+    print(f"Blit aligned:   {aligned_us / 1000:.2f} ms ({draw_us / max(aligned_us, 1):.1f}x)")
+    print(f"Blit shifted:   {shifted_us / 1000:.2f} ms ({draw_us / max(shifted_us, 1):.1f}x)")
+
+
+def bench_clip(frames=10):
+    # Scrolling over a world 4x the screen each way: most shapes miss the screen and
+    # are rejected by their bounding box before any scanline work
+    items = []
+    seed = 12345
+    for i in range(200):
+        seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF
+        items.append((i % 4, seed % (4 * H_res), (seed >> 12) % (4 * V_res)))
+
+    def visible(x, y):
+        return -80 < x < H_res and -60 < y < V_res
+
+    def draw_world(ox, oy, cull):
+        drawn = 0
+        for kind, x, y in items:
+            x -= ox
+            y -= oy
+            if cull and not visible(x, y):
+                continue
+            drawn += 1
+            if kind == 0:
+                fill_rect(x, y, x + 60, y + 40, RED)
+            elif kind == 1:
+                fill_disk(x + 30, y + 30, 30, GREEN)
+            elif kind == 2:
+                fill_triangle(x, y, x + 50, y + 10, x + 20, y + 60, BLUE)
+            else:
+                draw_text(x, y, "FAR AWAY", YELLOW, 2)
+        return drawn
+
+    times = []
+    for cull in (False, True):
+        t = ticks_us()
+        for f in range(frames):
+            fill_rect(0, 0, H_res, V_res, BLACK)
+            drawn = draw_world(f * 97, f * 61, cull)
+        times.append(ticks_diff(ticks_us(), t) / frames)
+    rejected = len(items) - drawn
+    print("--- Clip benchmark ---")
+    print(f"World: {len(items)} shapes, ~{drawn} near the screen")
+    print(f"All shapes:      {times[0] / 1000:.2f} ms/frame")
+    print(f"Pre-culled:      {times[1] / 1000:.2f} ms/frame")
+    print(f"Per rejected shape: {(times[0] - times[1]) / max(rejected, 1):.1f} us")
+
+    # Terminal style panel: long lines clipped at the border vs short lines fully inside
+    fill_screen(BLACK)
+    push_clip(TERM_X - 4, TERM_Y - 4, H_res - 5, V_res - 5)
+    for label, text in (("Clipped lines", "X" * 60), ("Inside lines", "X" * 28)):
+        t = ticks_us()
+        for n in range(TERM_MAX_LINES):
+            draw_text(TERM_X, TERM_Y + 15 * n, text, GREEN, 1)
+        print(f"{label}:   {ticks_diff(ticks_us(), t) / TERM_MAX_LINES:.0f} us/line")
+    pop_clip()
+
+
+def bench_pattern(reps=10):
+    # Dithered fills vs solid fills of the same shapes
+    shade = dither(CYAN, BLUE, 6)
+    shapes = (
+        ("fill_rect", lambda c: fill_rect(20, 20, 620, 460, c)),
+        ("fill_triangle", lambda c: fill_triangle(30, 450, 320, 20, 610, 400, c)),
+        ("fill_disk", lambda c: fill_disk(320, 240, 200, c)),
+    )
+    print("--- Pattern fill benchmark ---")
+    for name, draw in shapes:
+        us = []
+        for color in (CYAN, shade):
+            t = ticks_us()
+            for _ in range(reps):
+                draw(color)
+            us.append(ticks_diff(ticks_us(), t) / reps)
+        print(f"{name:<14} solid {us[0] / 1000:6.2f} ms  dither {us[1] / 1000:6.2f} ms  ({us[1] / max(us[0], 1):.2f}x)")
+
+
+def bench_gc(frames=30):
+    # Steady-state frames must not allocate: on the Pico every GC pause is a dropped frame
+    global current_mode, mode_changed, demo_spans, term_head, term_count, terminal_dirty
+    saved_mode, saved_spans = current_mode, demo_spans
+    saved_lines, saved_colors = term_lines[:], bytes(term_colors)
+    saved_head, saved_count = term_head, term_count
+    print("--- Allocation check (bytes allocated over the measured frames) ---")
+    passed = True
+    for name in ("demo", "spans", "text"):
+        current_mode = "text" if name == "text" else "demo"
+        demo_spans = SpanRenderer(80, 60, 560, 420) if name == "spans" else None
+        if name == "text":
+            for i in range(TERM_MAX_LINES):
+                add_to_terminal("Line " + str(i), WHITE)
+        mode_changed = True
+        for _ in range(3):
+            render_frame()  # Warm up: first frames fill caches and intern strings
+        collect()
+        before = mem_free()
+        for _ in range(frames):
+            terminal_dirty = True  # Redraw the terminal every frame, not just when it changes
+            render_frame()
+        used = before - mem_free()
+        passed = passed and used == 0
+        print(f"{name}: {used} bytes in {frames} frames {'PASS' if used == 0 else 'FAIL'}")
+    current_mode, demo_spans = saved_mode, saved_spans
+    term_lines[:] = saved_lines
+    term_colors[:] = saved_colors
+    term_head, term_count = saved_head, saved_count
+    terminal_dirty = mode_changed = True
+    collect()
+    return passed
+
+
+BENCHMARKS = {
+    "TILES": bench_tiles,
+    "ROP": bench_rop,
+    "SPANS": bench_spans,
+    "SHAPES": bench_shapes,
+    "BLIT": bench_blit,
+    "CLIP": bench_clip,
+    "PATTERN": bench_pattern,
+    "TEXT": bench_text,
+    "GC": bench_gc,
+    "GPIO": bench_gpio,
+}
+
+
+# Terminal settings
+TERM_X, TERM_Y = 440, 10
+TERM_WIDTH, TERM_HEIGHT = 190, 460
+TERM_MAX_LINES = 28
+
+TERM_LINE_CHARS = 28
+
+text_buffer = []
+# Terminal lines in a ring buffer (appending never shifts or reallocates)
+term_lines = [""] * TERM_MAX_LINES
+term_colors = bytearray(TERM_MAX_LINES)
+term_head = 0  # Oldest line
+term_count = 0
+terminal_dirty = True  # Redraw only when the terminal content changed
+current_mode = "demo"
+previous_mode = "demo"
+cube = Cube3D()
+cube.set_spin(0.05, 0.07, 0.03)
+mode_changed = False
+show_terminal = True
+demo_spans = None  # SpanRenderer for the demo, allocated by SPANS ON
+
+# Static overlays, rendered once into surfaces on first use and blitted afterwards
+TERM_HEADER = 26  # Rows of the terminal frame holding the title
+term_header = None
+help_panel = None
+
+def terminal_header():
+    global term_header
+    if term_header is None:
+        term_header = Surface(H_res - TERM_X + 1, TERM_HEADER)
+        with term_header:
+            fill_screen(BLACK)
+            draw_text(5, 5, "Terminal", GREEN, 1)
+            draw_text(5, 17, "GP16-GP21", CYAN, 1)
+    return term_header
+
+def help_screen():
+    global help_panel
+    if help_panel is None:
+        help_panel = Surface(200, 175)
+        with help_panel:
+            fill_screen(BLACK)
+            draw_text(0, 0, "Commands:", WHITE, 2)
+            draw_text(0, 30, "BLUE, RED, GREEN", CYAN, 1)
+            draw_text(0, 45, "MULTICOLOUR", CYAN, 1)
+            draw_text(0, 60, "DEMO - 3D cube", CYAN, 1)
+            draw_text(0, 75, "TEXT - cmd prompt", CYAN, 1)
+            draw_text(0, 90, "GPIO <16-21> ON/OFF", CYAN, 1)
+            draw_text(0, 105, "STATUS, CLEAR, HELP", CYAN, 1)
+            draw_text(0, 120, "SPANS ON/OFF - diff render", CYAN, 1)
+            draw_text(0, 135, "BENCH <name>", CYAN, 1)
+            draw_text(0, 150, "GPIO MASK m VALUE v, GPIO PULSE", CYAN, 1)
+            draw_text(0, 165, "SHADE ON/OFF - lit cube", CYAN, 1)
+    return help_panel
+
+def add_to_terminal(message, color=WHITE):
+    global term_head, term_count, terminal_dirty
+    if len(message) > TERM_LINE_CHARS:
+        message = message[:TERM_LINE_CHARS]  # Truncated once here, not on every redraw
+    if term_count < TERM_MAX_LINES:
+        i = (term_head + term_count) % TERM_MAX_LINES
+        term_count += 1
+    else:
+        i = term_head
+        term_head = (term_head + 1) % TERM_MAX_LINES
+    term_lines[i] = message
+    term_colors[i] = color
+    terminal_dirty = True
+
+def clear_terminal():
+    global term_head, term_count, terminal_dirty
+    for i in range(TERM_MAX_LINES):
+        term_lines[i] = ""
+    term_head = 0
+    term_count = 0
+    terminal_dirty = True
+
+def draw_terminal():
+    global terminal_dirty
+    if not show_terminal:
+        return
+    terminal_dirty = False
+    blit(terminal_header(), VGA.screen, TERM_X - 5, TERM_Y - 5)
+    fill_rect(TERM_X - 5, TERM_Y - 5 + TERM_HEADER, H_res - 5, V_res - 5, BLACK)
+    draw_rect(TERM_X - 5, TERM_Y - 5, H_res - 5, V_res - 5, WHITE)
+    push_clip(TERM_X - 4, TERM_Y - 4, H_res - 5, V_res - 5)  # Keep text inside the border
+    y_pos = TERM_Y + 30
+    for n in range(term_count):
+        if y_pos > TERM_Y + TERM_HEIGHT - 20:
+            break
+        i = (term_head + n) % TERM_MAX_LINES
+        draw_text(TERM_X, y_pos, term_lines[i], term_colors[i], 1)
+        y_pos += 15
+    pop_clip()
+
+
+
+# Write command processor
+def process_command(cmd):
+    global current_mode, text_buffer, mode_changed, previous_mode, show_terminal, demo_spans
+    original_cmd = cmd.strip()
+    cmd_upper = cmd.strip().upper()
+    
+    # Bulk GPIO: GPIO MASK 0x3F VALUE 0x15, GPIO PULSE <mask> <width us> <count>
+    if cmd_upper.startswith("GPIO MASK") or cmd_upper.startswith("GPIO PULSE"):
+        parts = cmd_upper.split()
+        try:
+            if parts[1] == "MASK" and len(parts) == 5 and parts[3] == "VALUE":
+                success, msg = gpio_write(int(parts[2], 0), int(parts[4], 0))
+            elif parts[1] == "PULSE" and len(parts) == 5:
+                mask = int(parts[2], 0)
+                width, count = int(parts[3]), int(parts[4])
+                if _pulses_ok(width, count):
+                    success, msg = gpio_play(gpio_pulses(mask, width, count), mask)
+                else:
+                    success, msg = False, f"Width > 0 us, count 1-{GPIO_PULSE_MAX}, 1 s total"
+            else:
+                success, msg = False, "Use: GPIO MASK 0x3F VALUE 0x15"
+        except ValueError:
+            success, msg = False, "Invalid GPIO command"
+        if current_mode == "text":
+            add_to_terminal(f"> {original_cmd}", CYAN)
+            add_to_terminal(msg, GREEN if success else RED)
+        return msg
+
+    # for GPIO
+    elif cmd_upper.startswith("GPIO ") or cmd_upper.startswith("GP"):
+        parts = cmd_upper.replace("GPIO", "GP").split()
+        if len(parts) >= 2:
+            try:
+                pin_str = parts[0].replace("GP", "")
+                if not pin_str and len(parts) >= 3:
+                    pin_str = parts[1]
+                    state_str = parts[2] if len(parts) > 2 else ""
+                else:
+                    state_str = parts[1] if len(parts) > 1 else ""
+                pin_num = int(pin_str)
+                
+                if state_str in ["ON", "1", "HIGH"]:
+                    success, msg = gpio_control(pin_num, True)
+                    if current_mode == "text":
+                        add_to_terminal(f"> {original_cmd}", CYAN)
+                        add_to_terminal(msg, GREEN if success else RED)
+                    return msg
+                elif state_str in ["OFF", "0", "LOW"]:
+                    success, msg = gpio_control(pin_num, False)
+                    if current_mode == "text":
+                        add_to_terminal(f"> {original_cmd}", CYAN)
+                        add_to_terminal(msg, YELLOW if success else RED)
+                    return msg
+                else:
+                    msg = "Use: GPIO 16 ON/OFF"
+                    if current_mode == "text":
+                        add_to_terminal(f"> {original_cmd}", CYAN)
+                        add_to_terminal(msg, RED)
+                    return msg
+            except (ValueError, IndexError):
+                msg = "Invalid GPIO command"
+                if current_mode == "text":
+                    add_to_terminal(f"> {original_cmd}", CYAN)
+                    add_to_terminal(msg, RED)
+                return msg
+    
+    # For color
+    elif cmd_upper == "BLUE":
+        previous_mode = current_mode
+        current_mode = "static"
+        mode_changed = True
+        fill_screen(BLUE)
+        draw_text(10, 10, "BLUE MODE", WHITE, 2)
+        draw_text(10, 40, "Type DEMO to return", CYAN, 1)
+        return "Switched to BLUE"
+    
+    elif cmd_upper == "RED":
+        previous_mode = current_mode
+        current_mode = "static"
+        mode_changed = True
+        fill_screen(RED)
+        draw_text(10, 10, "RED MODE", WHITE, 2)
+        draw_text(10, 40, "Type DEMO to return", CYAN, 1)
+        return "Switched to RED"
+    
+    elif cmd_upper == "GREEN":
+        previous_mode = current_mode
+        current_mode = "static"
+        mode_changed = True
+        fill_screen(GREEN)
+        draw_text(10, 10, "GREEN MODE", WHITE, 2)
+        draw_text(10, 40, "Type DEMO to return", CYAN, 1)
+        return "Switched to GREEN"
+    
+    elif cmd_upper == "MULTICOLOUR" or cmd_upper == "MULTICOLOR":
+        previous_mode = current_mode
+        current_mode = "static"
+        mode_changed = True
+        for h in range(8):
+            for i in range(60):
+                for k in range(8):
+                    draw_fastHline(k * 80, k * 80 + 80, h * 60 + i, (h + k) % 8)
+        draw_text(10, 10, "MULTICOLOUR", BLACK, 2)
+        draw_text(10, 40, "Type DEMO to return", WHITE, 1)
+        return "Switched to MULTICOLOUR"
+    
+    # For Mode selection
+    elif cmd_upper == "DEMO":
+        previous_mode = current_mode
+        current_mode = "demo"
+        mode_changed = True
+        fill_screen(BLACK)
+        return "Starting 3D cube demo"
+    
+    elif cmd_upper == "TEXT":
+        previous_mode = current_mode
+        current_mode = "text"
+        mode_changed = True
+        clear_terminal()
+        text_buffer = []
+        fill_screen(BLACK)
+        add_to_terminal("TEXT MODE", GREEN)
+        add_to_terminal("Type anything", CYAN)
+        add_to_terminal("GPIO commands work", CYAN)
+        return "TEXT mode"
+    
+    # for healper commands
+    elif cmd_upper == "CLEAR":
+        if current_mode == "text":
+            clear_terminal()
+            text_buffer = []
+            add_to_terminal("Terminal cleared", GREEN)
+        return "Terminal cleared"
+    
+    elif cmd_upper == "HELP":
+        if current_mode == "text":
+            add_to_terminal(f"> {original_cmd}", CYAN)
+            add_to_terminal("Commands:", WHITE)
+            add_to_terminal("GPIO <16-21> ON/OFF", GREEN)
+            add_to_terminal("GPIO MASK m VALUE v", GREEN)
+            add_to_terminal("DEMO, BLUE, RED", GREEN)
+            add_to_terminal("GREEN, MULTICOLOUR", GREEN)
+            add_to_terminal("CLEAR, STATUS, HELP", GREEN)
+            add_to_terminal("SPANS ON/OFF, BENCH", GREEN)
+            add_to_terminal("SHADE ON/OFF", GREEN)
+        else:
+            previous_mode = current_mode
+            current_mode = "static"
+            mode_changed = True
+            fill_screen(BLACK)
+            blit(help_screen(), VGA.screen, 10, 10)
+        return "Help displayed"
+    
+    elif cmd_upper == "STATUS":
+        if current_mode == "text":
+            add_to_terminal(f"> {original_cmd}", CYAN)
+            add_to_terminal("GPIO Status:", WHITE)
+            for pin in sorted(AVAILABLE_GPIOS):
+                if pin in gpio_pins:
+                    state = "ON" if gpio_pins[pin].value() else "OFF"
+                    color = GREEN if gpio_pins[pin].value() else YELLOW
+                    add_to_terminal(f"GP{pin}: {state}", color)
+                else:
+                    add_to_terminal(f"GP{pin}: INIT", WHITE)
+        return "Status displayed"
+    
+    elif cmd_upper in ("SHADE ON", "SHADE OFF"):
+        cube.shade = shade_dither if cmd_upper == "SHADE ON" else None
+        msg = "Dithered lighting " + ("ON" if cube.shade else "OFF")
+        if current_mode == "text":
+            add_to_terminal(f"> {original_cmd}", CYAN)
+            add_to_terminal(msg, GREEN)
+        return msg
+
+    elif cmd_upper in ("SPANS ON", "SPANS OFF"):
+        if cmd_upper == "SPANS ON":
+            if not demo_spans:
+                demo_spans = SpanRenderer(80, 60, 560, 420)
+        else:
+            demo_spans = None
+            collect()
+        mode_changed = True  # Start from a clean screen
+        msg = "Span-diff render " + ("ON" if demo_spans else "OFF")
+        if current_mode == "text":
+            add_to_terminal(f"> {original_cmd}", CYAN)
+            add_to_terminal(msg, GREEN)
+        return msg
+    
+    elif cmd_upper.startswith("BENCH"):
+        parts = cmd_upper.split()
+        name = parts[1] if len(parts) > 1 else ""
+        if name not in BENCHMARKS:
+            return "Use: BENCH " + "/".join(BENCHMARKS)
+        previous_mode = current_mode
+        current_mode = "static"
+        mode_changed = True
+        BENCHMARKS[name]()
+        return "Benchmark done"
+    
+    else:
+        if current_mode == "text" and original_cmd:
+            add_to_terminal(f"> {original_cmd}", WHITE)
+        return None
+
+serial_poll = select.poll()
+serial_poll.register(sys.stdin, select.POLLIN)
+
+def read_serial_input():
+    for _ in serial_poll.ipoll(0):  # ipoll doesn't allocate, select() builds lists every call
+        return sys.stdin.readline().strip()
+    return None
+
+# loop main program
+def render_frame():
+    # Draw one frame of the current mode. Must not allocate once warmed up (see BENCH GC)
+    global mode_changed
+    if current_mode == "demo":
+        if mode_changed:
+            fill_screen(BLACK)
+            if demo_spans:
+                demo_spans.reset()
+            mode_changed = False
+        elif not demo_spans:
+            clear_region(80, 60, 560, 420, BLACK)
+        cube.step()
+        if demo_spans:
+            demo_spans.begin()
+            cube.draw(filled=True, fill=demo_spans.fill_triangle)
+            demo_spans.present()
+        else:
+            cube.draw(filled=True)
+    
+    elif current_mode == "text":
+        if mode_changed:
+            fill_screen(BLACK)
+            mode_changed = False
+            draw_terminal()
+        elif terminal_dirty:
+            draw_terminal()
+
+def main_loop():
+    print("VGA Ready | GPIO: 16-21 | Type HELP")
+    fill_screen(BLACK)
+    
+    while True:
+        user_input = read_serial_input()
+        if user_input:
+            result = process_command(user_input)
+            if result:
+                print(result)
+        
+        t = ticks_ms()
+        render_frame()
+        if current_mode == "demo":
+            elapsed = ticks_diff(ticks_ms(), t)
+            if elapsed < 33:
+                sleep_ms(33 - elapsed)
+        elif current_mode == "text":
+            sleep_ms(50)
+        else:
+            sleep_ms(100)
+
+# Run n Run
+if __name__ == "__main__":
+    t = ticks_us()
+    init()
+    render_frame()
+    first_frame_ms = ticks_diff(ticks_us(), t) / 1000
+    print(f"Import: {import_us / 1000:.1f} ms, {import_kb:.1f} KB heap | init to first frame: {first_frame_ms:.1f} ms")
+    main_loop()
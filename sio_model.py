@@ -0,0 +1,42 @@
+# Host-side model of the RP2040 SIO output registers and the microsecond timer, to check
+# the bulk GPIO code in main.py on a PC. Not needed on the Pico, don't upload it.
+#   main.gpio_regs = main.gpio_timer = SioModel()
+# main.py's viper functions then index it like ptr32 would (micropython.viper must be a
+# no-op and ptr32 must return its argument). test_gpio.py sets that up.
+
+# Word offsets of the SIO registers main.py writes
+GPIO_OUT = 0x010 >> 2
+GPIO_OUT_SET = 0x014 >> 2
+GPIO_OUT_CLR = 0x018 >> 2
+GPIO_OUT_XOR = 0x01C >> 2
+
+
+class SioModel:
+    # Each output change is logged as (time_us, GPIO_OUT). Every timer read advances 1 us.
+    def __init__(self):
+        self.out = 0
+        self.now = 0
+        self.writes = 0  # Writes to the output registers, changing or not
+        self.log = []
+
+    def __getitem__(self, i):
+        if i == GPIO_OUT:
+            return self.out
+        if i == 0:  # Timer
+            self.now += 1
+            return self.now
+        return 0
+
+    def __setitem__(self, i, v):
+        if i == GPIO_OUT_SET:
+            v |= self.out
+        elif i == GPIO_OUT_CLR:
+            v = self.out & ~v
+        elif i == GPIO_OUT_XOR:
+            v ^= self.out
+        elif i != GPIO_OUT:
+            return
+        self.writes += 1
+        if v != self.out:
+            self.out = v
+            self.log.append((self.now, v))
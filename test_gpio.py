@@ -0,0 +1,142 @@
+# Checks the bulk GPIO code of main.py on a PC against SioModel: python test_gpio.py
+# (or pytest). Minimal stand-ins for the MicroPython modules let main.py import.
+import array
+import builtins
+import gc
+import sys
+import time
+import types
+from contextlib import contextmanager
+
+from sio_model import SioModel
+
+
+class _Anything:
+    # Constants and objects of machine/rp2/select the modules touch
+    OUT = 1
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Anything()
+
+    def __call__(self, *args, **kwargs):
+        return _Anything()
+
+
+def _ptr(a):
+    return a
+
+
+@contextmanager
+def _micropython_stand_ins():
+    # Patch in the MicroPython modules and builtins for the import only, then put the
+    # originals back so the rest of the process (subprocess, selectors...) is unaffected
+    std_array = array.array
+    micropython = types.ModuleType('micropython')
+    micropython.const = lambda x: x
+    micropython.viper = micropython.native = lambda f: f
+    machine = types.ModuleType('machine')
+    machine.Pin = _Anything
+    rp2 = types.ModuleType('rp2')
+    rp2.PIO = rp2.StateMachine = _Anything()
+    rp2.asm_pio = lambda *args, **kwargs: (lambda f: f)
+    uctypes = types.ModuleType('uctypes')
+    uctypes.addressof = id
+    stand_ins = {'micropython': micropython, 'machine': machine, 'rp2': rp2,
+                 'uctypes': uctypes, 'select': _Anything()}
+    attrs = [
+        (array, 'array', lambda typecode, *init: std_array({'l': 'i', 'L': 'I'}.get(typecode, typecode), *init)),
+        (builtins, 'micropython', micropython),
+        (builtins, 'ptr32', _ptr),
+        (builtins, 'ptr16', _ptr),
+        (builtins, 'ptr8', _ptr),
+        (gc, 'mem_free', lambda: 0),
+        (time, 'ticks_us', lambda: time.perf_counter_ns() // 1000),
+        (time, 'ticks_ms', lambda: time.perf_counter_ns() // 1000000),
+        (time, 'ticks_diff', lambda a, b: a - b),
+        (time, 'sleep_ms', lambda ms: None),
+    ]
+    missing = object()
+    saved_modules = {name: sys.modules.get(name, missing) for name in stand_ins}
+    saved_attrs = [(obj, name, getattr(obj, name, missing)) for obj, name, _ in attrs]
+    sys.modules.update(stand_ins)
+    for obj, name, value in attrs:
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, module in saved_modules.items():
+            if module is missing:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+        for obj, name, value in saved_attrs:
+            if value is missing:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, value)
+
+
+def _import_main():
+    with _micropython_stand_ins():
+        import main
+    main.ptr32 = _ptr  # Called by the viper functions at run time, as a module global
+    return main
+
+
+main = _import_main()
+
+
+def _model():
+    m = SioModel()
+    main.gpio_regs = main.gpio_timer = m
+    return m
+
+
+def test_write_changes_only_masked_pins():
+    m = _model()
+    others = (1 << 3) | (1 << 25) | (0b110000 << 16)  # Pins outside the mask stay set
+    m.out = others
+    ok, _ = main.gpio_write(0b000111, 0b000101)
+    assert ok
+    assert m.writes == 1
+    assert len(m.log) == 1
+    assert m.out == others | (0b101 << 16)
+    ok, _ = main.gpio_write(0b000111, 0b000010)
+    assert m.writes == 2
+    assert m.out == others | (0b010 << 16)
+
+
+def test_play_lands_on_deadlines():
+    m = _model()
+    steps = [(0x01, 10), (0x03, 20), (0x00, 5), (0x3F, 40), (0x00, 1)]
+    ok, _ = main.gpio_play(main.gpio_sequence(steps), 0x3F)
+    assert ok
+    start = m.log[0][0]
+    due = 0
+    for (t, out), (value, us) in zip(m.log, steps):
+        assert t - start == due
+        assert out == value << 16
+        due += us
+
+
+def test_bad_masks_and_pulses_are_refused():
+    m = _model()
+    assert not main.gpio_write(0x40, 0x40)[0]
+    assert not main.gpio_play(main.gpio_pulses(0x01, 10, 2), 0x80)[0]
+    assert m.writes == 0
+    for width, count in ((-5, 2), (10, 0), (10, main.GPIO_PULSE_MAX + 1), (main.GPIO_PLAY_MAX_US, 1)):
+        try:
+            main.gpio_pulses(0x01, width, count)
+        except ValueError:
+            continue
+        raise AssertionError((width, count))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name, "ok")